@@ -0,0 +1,109 @@
+import time
+import argparse
+import statistics
+
+from database import conn
+from schema import IndexConfig, SearchParams
+from index import IndexManager, apply_search_params
+
+SEARCH_SQL = """
+    SELECT id
+    FROM doc_chunks
+    ORDER BY embedding <=> %s
+    LIMIT %s
+"""
+
+
+def _sample_queries(n: int) -> list:
+    with conn.cursor() as cur:
+        cur.execute("SELECT embedding FROM doc_chunks ORDER BY random() LIMIT %s", (n,))
+        queries = [embedding for (embedding,) in cur.fetchall()]
+    conn.rollback()
+    return queries
+
+
+def _exact_neighbours(queries: list, k: int) -> list:
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_indexscan = off")
+        neighbours = []
+        for query in queries:
+            cur.execute(SEARCH_SQL, (query, k))
+            neighbours.append({id for (id,) in cur.fetchall()})
+    conn.rollback()
+    return neighbours
+
+
+def _ann_search(queries: list, k: int, search_params: SearchParams) -> tuple:
+    results, latencies = [], []
+    with conn.cursor() as cur:
+        apply_search_params(cur, search_params)
+        for query in queries:
+            start = time.perf_counter()
+            cur.execute(SEARCH_SQL, (query, k))
+            rows = cur.fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append({id for (id,) in rows})
+    conn.rollback()
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure ANN recall@k and latency against an exact scan."
+    )
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--build", choices=["hnsw", "ivfflat"])
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--lists", type=int, default=100)
+    parser.add_argument("--ef-search", default="10,20,40,80,160,320")
+    parser.add_argument("--probes", default="1,2,5,10,20,50")
+    args = parser.parse_args()
+
+    index_manager = IndexManager()
+    if args.build:
+        start = time.perf_counter()
+        index_manager.build_index(
+            IndexConfig(
+                method=args.build,
+                m=args.m,
+                ef_construction=args.ef_construction,
+                lists=args.lists,
+            )
+        )
+        print(f"Built {args.build} index in {time.perf_counter() - start:.1f}s")
+
+    index = index_manager.get_index()
+    if not index:
+        raise SystemExit("No vector index on doc_chunks, use --build to create one")
+    print(f"Index: {index.definition} ({index.size_bytes / 2**20:.1f} MiB)")
+
+    queries = _sample_queries(args.queries)
+    exact = _exact_neighbours(queries, args.k)
+
+    if index.method == "hnsw":
+        name = "ef_search"
+        settings = [SearchParams(ef_search=int(v)) for v in args.ef_search.split(",")]
+    else:
+        name = "probes"
+        settings = [SearchParams(probes=int(v)) for v in args.probes.split(",")]
+
+    print(f"{name:>10}{f'recall@{args.k}':>12}{'p50 (ms)':>12}{'p95 (ms)':>12}")
+    for search_params in settings:
+        results, latencies = _ann_search(queries, args.k, search_params)
+        recall = statistics.mean(
+            len(found & expected) / len(expected)
+            for found, expected in zip(results, exact)
+            if expected
+        )
+        latencies.sort()
+        print(
+            f"{getattr(search_params, name):>10}{recall:>12.3f}"
+            f"{statistics.median(latencies):>12.2f}"
+            f"{latencies[int(len(latencies) * 0.95) - 1]:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import os
+import re
+import sys
+import ast
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATEGORIES = re.compile(r"categories:\s*(\[.*?\])", re.DOTALL)
+
+
+class _StubLLMHandler(BaseHTTPRequestHandler):
+    # Answers OpenAI chat completions after a fixed delay, with a decision
+    # that fits the agent whose prompt it receives.
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][-1]["content"]
+        time.sleep(self.server.latency * (1 + random.random() * self.server.jitter))
+        with self.server.lock:
+            self.server.calls += 1
+
+        if "Classify this text" in prompt:
+            options = ast.literal_eval(CATEGORIES.search(prompt).group(1))
+            content = json.dumps({"value": options[0], "reason": "stub"})
+        elif "true or false" in prompt:
+            content = json.dumps({"value": True, "reason": "stub"})
+        elif "numeric value" in prompt:
+            content = json.dumps({"value": 5, "reason": "stub"})
+        else:
+            content = "Stub answer."
+
+        payload = json.dumps(
+            {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "total_tokens": 0,
+                },
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_stub(latency: float, jitter: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.lock = threading.Lock()
+    server.calls = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def _probe_loop_lag(interval: float, lags: list):
+    # How late the event loop wakes up a task that only sleeps, i.e. how
+    # long other requests would have waited for the loop.
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def _run_once(
+    graph_manager, query: str, speculative: bool = False, speculation: list = None
+) -> float:
+    from simulation import Executor
+
+    executor = Executor(graph_manager)
+    start = time.perf_counter()
+    run = await executor.compile_graph(
+        query=query, use_run_cache=False, speculative=speculative
+    )
+    result = await executor.run(run)
+    if speculation is not None and result.speculation is not None:
+        speculation.append(result.speculation)
+    return time.perf_counter() - start
+
+
+async def _measure(
+    graph_manager,
+    query: str,
+    runs: int,
+    concurrent: bool,
+    speculative: bool,
+    speculation: list,
+) -> tuple:
+    lags = []
+    probe = asyncio.create_task(_probe_loop_lag(0.01, lags))
+    start = time.perf_counter()
+    if concurrent:
+        latencies = await asyncio.gather(
+            *(
+                _run_once(graph_manager, query, speculative, speculation)
+                for _ in range(runs)
+            )
+        )
+    else:
+        latencies = [
+            await _run_once(graph_manager, query, speculative, speculation)
+            for _ in range(runs)
+        ]
+    wall = time.perf_counter() - start
+    probe.cancel()
+    latencies = sorted(latencies)
+    return (
+        wall,
+        runs / wall,
+        statistics.median(latencies),
+        latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+        max(lags, default=0.0) * 1000,
+    )
+
+
+async def _benchmark(args, server: ThreadingHTTPServer):
+    from database import pool, async_pool
+    from graph import GraphManager
+
+    pool.open()
+    await async_pool.open()
+    try:
+        graph_manager = GraphManager()
+        # One run first so model loading and connection setup are not timed.
+        await _run_once(graph_manager, args.query)
+        calls = server.calls
+
+        print(
+            f"{'mode':<12}{'runs':>6}{'wall (s)':>10}{'runs/s':>10}"
+            f"{'p50 (s)':>10}{'p95 (s)':>10}{'max lag (ms)':>14}"
+        )
+        # "speculative" runs one after another too, with every decision agent
+        # started at run start, so its p50 compares with "sequential".
+        speculation = []
+        for mode in ("sequential", "concurrent", "speculative"):
+            wall, throughput, p50, p95, lag = await _measure(
+                graph_manager,
+                args.query,
+                args.runs,
+                mode == "concurrent",
+                mode == "speculative",
+                speculation,
+            )
+            print(
+                f"{mode:<12}{args.runs:>6}{wall:>10.2f}{throughput:>10.2f}"
+                f"{p50:>10.2f}{p95:>10.2f}{lag:>14.1f}"
+            )
+        print(f"\nLLM calls per run: {calls}, stub latency {args.latency:.2f}s each")
+
+        launched = sum(stats.launched for stats in speculation)
+        used = sum(stats.used for stats in speculation)
+        cancelled = sum(stats.cancelled for stats in speculation)
+        print(
+            f"Speculated decisions: {launched} launched, {used} used, "
+            f"{cancelled} cancelled before finishing, "
+            f"{launched - used - cancelled} wasted"
+        )
+        # Branches not taken should be cancelled by the edge routers while
+        # their calls are still running, not after the run has finished.
+        return not (launched > used and cancelled == 0)
+    finally:
+        await async_pool.close()
+        pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run simulations one after another, concurrently and with speculative decision agents against a local stub LLM."
+    )
+    parser.add_argument("--runs", type=int, default=32)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.5,
+        help="Seconds the stub LLM takes per completion",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.5,
+        help="Completions take up to this fraction longer, at random",
+    )
+    parser.add_argument("--query", default="How do I reset my password?")
+    args = parser.parse_args()
+
+    server = _start_stub(args.latency, args.jitter)
+    # Set before the backend modules are imported, they read it at import.
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("API_KEY", "stub")
+    try:
+        saved = asyncio.run(_benchmark(args, server))
+    finally:
+        server.shutdown()
+    if not saved:
+        sys.exit("No unused speculation was cancelled before its call finished")
+
+
+if __name__ == "__main__":
+    main()
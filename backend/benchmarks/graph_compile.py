@@ -0,0 +1,53 @@
+import time
+import asyncio
+import argparse
+import statistics
+
+from database import async_pool
+from graph import GraphManager
+
+
+async def _timed_runtime(graph_manager: GraphManager, cold: bool) -> float:
+    # A fresh manager has nothing cached and compiles on its first lookup.
+    if cold:
+        graph_manager = GraphManager()
+    start = time.perf_counter()
+    await graph_manager.get_runtime()
+    return (time.perf_counter() - start) * 1000
+
+
+async def _benchmark(repeat: int):
+    await async_pool.open()
+    try:
+        graph_manager = GraphManager()
+        await graph_manager.get_runtime()  # pool and import warm-up
+
+        print(f"{'runtime':<12}{'runs':>6}{'p50 (ms)':>12}{'p95 (ms)':>12}")
+        for label, cold in (("compiled", True), ("cached", False)):
+            latencies = sorted(
+                [await _timed_runtime(graph_manager, cold) for _ in range(repeat)]
+            )
+            print(
+                f"{label:<12}{repeat:>6}{statistics.median(latencies):>12.2f}"
+                f"{latencies[max(int(repeat * 0.95) - 1, 0)]:>12.2f}"
+            )
+
+        graph = graph_manager.get_graph()
+        print(
+            f"\nGraph: {len(graph.nodes)} agents, {sum(map(len, graph.edges.values()))} edges"
+        )
+    finally:
+        await async_pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare compiling the LangGraph runtime with reusing the cached one."
+    )
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(_benchmark(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import sys
+import time
+import argparse
+import numpy as np
+from scipy.stats import spearmanr
+
+from database import conn
+from models import ONNX_QUANTIZATION, load_embedding, load_reranking
+
+
+def _sample_texts(n: int) -> list:
+    with conn.cursor() as cur:
+        cur.execute("SELECT content FROM doc_chunks ORDER BY random() LIMIT %s", (n,))
+        texts = [content for (content,) in cur.fetchall()]
+    conn.rollback()
+    return texts
+
+
+def _rerank_pairs(texts: list, queries: int, candidates: int) -> list:
+    # Short queries cut from the chunks themselves, each paired with a
+    # window of chunks the way retrieval hands candidates to the reranker.
+    pairs = []
+    for i in range(min(queries, len(texts))):
+        query = " ".join(texts[i].split()[:12])
+        for j in range(candidates):
+            pairs.append((query, texts[(i + j) % len(texts)]))
+    return pairs
+
+
+def _timed(fn, items: int, repeat: int) -> tuple:
+    fn()  # warm-up, the first call pays for session / graph initialisation
+    start = time.perf_counter()
+    for _ in range(repeat):
+        output = fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    return output, items / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare throughput and accuracy drift of the PyTorch and ONNX inference backends."
+    )
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=16)
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--quantization",
+        default=ONNX_QUANTIZATION or "avx2",
+        choices=["arm64", "avx2", "avx512", "avx512_vnni"],
+    )
+    parser.add_argument(
+        "--min-cosine",
+        type=float,
+        default=0.98,
+        help="Fail if an embedding is less cosine-similar than this to PyTorch's",
+    )
+    parser.add_argument(
+        "--min-spearman",
+        type=float,
+        default=0.95,
+        help="Fail if rerank scores correlate less than this with PyTorch's",
+    )
+    args = parser.parse_args()
+
+    texts = _sample_texts(args.texts)
+    if not texts:
+        raise SystemExit("No chunks in doc_chunks to benchmark with")
+    pairs = _rerank_pairs(texts, args.queries, args.candidates)
+
+    variants = [("torch", ""), ("onnx", ""), ("onnx", args.quantization)]
+    reference = None
+    failed = False
+
+    print(
+        f"{'backend':<22}{'embed/s':>10}{'pairs/s':>10}"
+        f"{'min cos':>10}{'mean cos':>10}{'spearman':>10}{'max |Δ|':>10}"
+    )
+    for backend, quantization in variants:
+        embedding = load_embedding(backend, quantization)
+        reranking = load_reranking(backend, quantization)
+
+        vectors, embed_rate = _timed(
+            lambda: np.asarray(embedding.embed_documents(texts)),
+            len(texts),
+            args.repeat,
+        )
+        scores, rerank_rate = _timed(
+            lambda: np.asarray(reranking.predict(pairs)), len(pairs), args.repeat
+        )
+
+        label = backend + (f" int8 ({quantization})" if quantization else "")
+        if reference is None:
+            reference = (vectors, scores)
+            print(f"{label:<22}{embed_rate:>10.0f}{rerank_rate:>10.0f}")
+            continue
+
+        # Embeddings are normalised, so the row-wise dot product is the cosine.
+        cosine = np.sum(vectors * reference[0], axis=1)
+        spearman = spearmanr(scores, reference[1]).statistic
+        print(
+            f"{label:<22}{embed_rate:>10.0f}{rerank_rate:>10.0f}"
+            f"{cosine.min():>10.4f}{cosine.mean():>10.4f}{spearman:>10.4f}"
+            f"{np.abs(scores - reference[1]).max():>10.4f}"
+        )
+        if cosine.min() < args.min_cosine or spearman < args.min_spearman:
+            failed = True
+
+    if failed:
+        print("\nAccuracy drift above the allowed threshold")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
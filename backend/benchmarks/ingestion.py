@@ -0,0 +1,68 @@
+import time
+import pymupdf
+import argparse
+from pathlib import Path
+
+from database import conn
+from models import get_embedding
+from pdf import iter_pages
+from file import _iter_chunks, _insert_chunks, _copy_chunks, delete_file_from_db
+
+SAMPLE_DIR = Path(__file__).resolve().parents[2] / "sample_file"
+BENCH_PREFIX = "__bench__"
+
+
+def _timed_write(write_chunks, file_name, chunks, embeddings) -> float:
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        write_chunks(cur, file_name, chunks, embeddings)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    delete_file_from_db(file_name=file_name)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare row-by-row INSERT and binary COPY chunk ingestion."
+    )
+    parser.add_argument("--sample-dir", type=Path, default=SAMPLE_DIR)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = sorted(args.sample_dir.glob("*.pdf"))
+    if not paths:
+        raise SystemExit(f"No PDF found in {args.sample_dir}")
+
+    total_chunks = 0
+    total = {"insert": 0.0, "copy": 0.0}
+
+    print(f"{'file':<28}{'chunks':>8}{'insert (s)':>12}{'copy (s)':>12}{'speedup':>10}")
+    for path in paths:
+        with pymupdf.open(path) as doc:
+            chunks = list(_iter_chunks(iter_pages(doc)))
+        embeddings = get_embedding().embed_documents(chunks)
+        file_name = f"{BENCH_PREFIX}{path.name}"
+
+        timings = {}
+        for name, write_chunks in (("insert", _insert_chunks), ("copy", _copy_chunks)):
+            timings[name] = min(
+                _timed_write(write_chunks, file_name, chunks, embeddings)
+                for _ in range(args.repeat)
+            )
+            total[name] += timings[name]
+
+        total_chunks += len(chunks)
+        print(
+            f"{path.name[:27]:<28}{len(chunks):>8}"
+            f"{timings['insert']:>12.3f}{timings['copy']:>12.3f}"
+            f"{timings['insert'] / timings['copy']:>9.1f}x"
+        )
+
+    print()
+    for name, elapsed in total.items():
+        print(f"{name:<8}{total_chunks / elapsed:>10.0f} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
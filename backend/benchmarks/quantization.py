@@ -0,0 +1,152 @@
+import time
+import argparse
+import statistics
+
+from database import conn, pool
+from schema import IndexConfig, SearchParams, VectorIndex
+from index import IndexManager, VECTOR_QUANTIZATION
+from retrieval import search_chunks, vector_mirror
+
+EXACT_SQL = """
+    SELECT id
+    FROM doc_chunks
+    ORDER BY embedding <=> %s
+    LIMIT %s
+"""
+
+
+def _sample_queries(n: int) -> list:
+    with conn.cursor() as cur:
+        cur.execute("SELECT embedding FROM doc_chunks ORDER BY random() LIMIT %s", (n,))
+        queries = [embedding.tolist() for (embedding,) in cur.fetchall()]
+    conn.rollback()
+    return queries
+
+
+def _exact_neighbours(queries: list, k: int) -> list:
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_indexscan = off")
+        neighbours = []
+        for query in queries:
+            cur.execute(EXACT_SQL, (query, k))
+            neighbours.append({id for (id,) in cur.fetchall()})
+    conn.rollback()
+    return neighbours
+
+
+def _table_size() -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_table_size('doc_chunks')")
+        size = cur.fetchone()[0]
+    conn.rollback()
+    return size
+
+
+def _measure(queries: list, exact: list, k: int, backend: str, search_params) -> tuple:
+    latencies, recalls = [], []
+    for query, expected in zip(queries, exact):
+        start = time.perf_counter()
+        rows = search_chunks(query, k=k, search_params=search_params, backend=backend)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if expected:
+            recalls.append(len({row[0] for row in rows} & expected) / len(expected))
+    latencies.sort()
+    return (
+        statistics.mean(recalls),
+        statistics.median(latencies),
+        latencies[int(len(latencies) * 0.95) - 1],
+    )
+
+
+def _print_row(label: str, size_bytes: int, oversample: int, measured: tuple):
+    recall, p50, p95 = measured
+    print(
+        f"{label:<20}{size_bytes / 2**20:>12.1f}{oversample:>12}"
+        f"{recall:>12.3f}{p50:>12.2f}{p95:>12.2f}"
+    )
+
+
+def _restore_index(index_manager: IndexManager, index: VectorIndex):
+    # Rebuilds the index that was in place before the benchmark, or drops
+    # the last one built if there was none.
+    if index is None:
+        index_manager.drop_index()
+        return
+    options = {name: int(value) for name, value in index.options.items()}
+    index_manager.build_index(
+        IndexConfig(method=index.method, quantization=index.quantization, **options)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare footprint, latency and recall@k of quantized embedding search."
+    )
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--oversample", default="1,2,4,10")
+    parser.add_argument(
+        "--skip-pgvector",
+        action="store_true",
+        help="Only benchmark the numpy mirror, leaving the current index untouched",
+    )
+    args = parser.parse_args()
+    oversamples = [int(v) for v in args.oversample.split(",")]
+
+    queries = _sample_queries(args.queries)
+    exact = _exact_neighbours(queries, args.k)
+    print(f"doc_chunks table (full float32 vectors): {_table_size() / 2**20:.1f} MiB\n")
+
+    header = (
+        f"{'storage':<20}{'size (MiB)':>12}{'oversample':>12}"
+        f"{f'recall@{args.k}':>12}{'p50 (ms)':>12}{'p95 (ms)':>12}"
+    )
+
+    if not args.skip_pgvector:
+        index_manager = IndexManager()
+        original = index_manager.get_index()
+        print(f"pgvector {args.method} index")
+        print(header)
+        try:
+            for quantization in ("none", "halfvec", "binary"):
+                index = index_manager.build_index(
+                    IndexConfig(method=args.method, quantization=quantization)
+                )
+                for oversample in oversamples if quantization != "none" else [1]:
+                    search_params = SearchParams(
+                        quantization=quantization, oversample=oversample
+                    )
+                    measured = _measure(
+                        queries, exact, args.k, "pgvector", search_params
+                    )
+                    _print_row(quantization, index.size_bytes, oversample, measured)
+        finally:
+            _restore_index(index_manager, original)
+        print()
+
+    print("numpy mirror")
+    print(header)
+    for quantization in ("none", "halfvec", "int8", "binary"):
+        vector_mirror.sync(conn, quantization)
+        snapshot = vector_mirror.directory / (
+            (vector_mirror.directory / "CURRENT").read_text().strip()
+        )
+        codes = snapshot / ("codes.npy" if quantization != "none" else "embeddings.npy")
+        size_bytes = codes.stat().st_size
+        if (snapshot / "scales.npy").exists():
+            size_bytes += (snapshot / "scales.npy").stat().st_size
+        for oversample in oversamples if quantization != "none" else [1]:
+            search_params = SearchParams(
+                quantization=quantization, oversample=oversample
+            )
+            measured = _measure(queries, exact, args.k, "numpy", search_params)
+            _print_row(quantization, size_bytes, oversample, measured)
+
+    vector_mirror.sync(conn, VECTOR_QUANTIZATION)
+
+
+if __name__ == "__main__":
+    # search_chunks queries the pgvector backend through the pool.
+    with pool:
+        main()
@@ -0,0 +1,56 @@
+import time
+import argparse
+import statistics
+
+from database import conn, pool
+from retrieval import search_chunks, vector_mirror
+
+
+def _sample_queries(n: int) -> list:
+    with conn.cursor() as cur:
+        cur.execute("SELECT embedding FROM doc_chunks ORDER BY random() LIMIT %s", (n,))
+        queries = [embedding.tolist() for (embedding,) in cur.fetchall()]
+    conn.rollback()
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare top-k latency of the pgvector and numpy retrieval backends."
+    )
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    vector_mirror.sync(conn)
+    print(f"Mirror rebuilt in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    queries = _sample_queries(args.queries)
+    results = {}
+    print(f"{'backend':<10}{'p50 (ms)':>12}{'p95 (ms)':>12}{'qps':>10}")
+    for backend in ("pgvector", "numpy"):
+        latencies, results[backend] = [], []
+        for query in queries:
+            start = time.perf_counter()
+            rows = search_chunks(query, k=args.k, backend=backend)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results[backend].append({row[0] for row in rows})
+
+        latencies.sort()
+        print(
+            f"{backend:<10}{statistics.median(latencies):>12.3f}"
+            f"{latencies[int(len(latencies) * 0.95) - 1]:>12.3f}"
+            f"{1000 * len(latencies) / sum(latencies):>10.0f}"
+        )
+
+    overlap = statistics.mean(
+        len(a & b) / len(a) for a, b in zip(results["pgvector"], results["numpy"]) if a
+    )
+    print(f"\ntop-{args.k} overlap between backends: {overlap:.3f}")
+
+
+if __name__ == "__main__":
+    # search_chunks queries the pgvector backend through the pool.
+    with pool:
+        main()
@@ -0,0 +1,106 @@
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+# Modules that only the model loaders should pull in.
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "langchain_openai",
+    "langchain_huggingface",
+    "onnxruntime",
+]
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _profile_import(module: str) -> tuple:
+    # A fresh interpreter for every run, -X importtime writes one line per
+    # imported module with its self and cumulative time in microseconds.
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "MODEL_WARMUP": "false"},
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise SystemExit(completed.stderr.strip().splitlines()[-1])
+
+    imports = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            _, cumulative, indent, name = match.groups()
+            imports[name] = (int(cumulative) / 1e6, len(indent) // 2)
+    return elapsed, imports
+
+
+def _time_model_loads():
+    sys.path.insert(0, str(BACKEND_DIR))
+    from models import _models
+
+    print(f"\n{'model':<14}{'first load (s)':>16}")
+    for key, lazy_model in _models.items():
+        start = time.perf_counter()
+        lazy_model.get()
+        print(f"{key:<14}{time.perf_counter() - start:>16.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Profile the import time of the backend and report modules that slow down startup."
+    )
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=None,
+        help="Fail if the median import takes longer than this",
+    )
+    parser.add_argument(
+        "--load-models",
+        action="store_true",
+        help="Also time the first load of every lazily loaded model",
+    )
+    args = parser.parse_args()
+
+    runs = [_profile_import(args.module) for _ in range(args.repeat)]
+    elapsed = sorted(run[0] for run in runs)
+    median = elapsed[len(elapsed) // 2]
+    imports = runs[-1][1]
+
+    print(f"import {args.module}: median {median:.2f}s over {args.repeat} runs")
+    print(f"\n{'top-level import':<40}{'cumulative (s)':>16}")
+    top_level = sorted(
+        ((name, seconds) for name, (seconds, depth) in imports.items() if depth == 0),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    for name, seconds in top_level[: args.top]:
+        print(f"{name:<40}{seconds:>16.3f}")
+
+    eager = [name for name in HEAVY_MODULES if name in imports]
+    if eager:
+        print(
+            f"\nImported at startup although only models need them: {', '.join(eager)}"
+        )
+
+    if args.load_models:
+        _time_model_loads()
+
+    if eager or (args.max_seconds is not None and median > args.max_seconds):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Tuple, Dict, Optional
+from psycopg import Connection, Cursor
+from psycopg.types.json import Json
+from pgvector import Vector
+
+from database import conn, pool, async_pool
+from schema import CacheStats, LLMCacheStats, Result, RunCacheStats
+from models import (
+    EMBEDDING_MODEL_ID,
+    RERANK_MODEL_ID,
+    LLM_MODEL,
+    LLM_BASE_URL,
+    get_embedding,
+)
+from inference import embed_batcher, rerank_batcher
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", "3600"))
+RUN_CACHE_ENABLED = os.getenv("RUN_CACHE_ENABLED", "false").lower() == "true"
+# Cosine similarity a cached query needs to be served for another query,
+# 1 only serves exact matches.
+RUN_CACHE_SIMILARITY = float(os.getenv("RUN_CACHE_SIMILARITY", "1"))
+RUN_CACHE_TTL = float(os.getenv("RUN_CACHE_TTL", "86400"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "10000"))
+# Seconds a decision stays valid, per agent type.
+LLM_CACHE_TTL = {
+    agent_type: float(os.getenv(f"LLM_CACHE_TTL_{agent_type.upper()}", "86400"))
+    for agent_type in ("classifier", "gatekeeper", "scorer")
+}
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def evict(self, predicate: Callable[[Hashable, Any], bool]):
+        with self._lock:
+            for key in [
+                key for key, (value, _) in self._data.items() if predicate(key, value)
+            ]:
+                del self._data[key]
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            total = self.hits + self.misses
+            return CacheStats(
+                size=len(self._data),
+                maxsize=self.maxsize,
+                hits=self.hits,
+                misses=self.misses,
+                hit_rate=round(self.hits / total, 4) if total else 0.0,
+            )
+
+
+class QueryEmbeddingCache:
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self._cache = LRUCache(maxsize, ttl)
+
+    def embed_query(self, query: str) -> List[float]:
+        # The model name is part of the key so vectors of another model are
+        # never served, invalidate() drops them when the model is swapped.
+        key = (EMBEDDING_MODEL_ID, query)
+        query_embedding = self._cache.get(key)
+        if query_embedding is None:
+            query_embedding = embed_batcher([query])[0]
+            self._cache.set(key, query_embedding)
+        return list(query_embedding)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        # Uncached queries are embedded together in one model call, shared
+        # with the queries of concurrent requests.
+        cached = {
+            query: self._cache.get((EMBEDDING_MODEL_ID, query)) for query in queries
+        }
+        missing = [query for query, vector in cached.items() if vector is None]
+        if missing:
+            for query, query_embedding in zip(missing, embed_batcher(missing)):
+                self._cache.set((EMBEDDING_MODEL_ID, query), query_embedding)
+                cached[query] = query_embedding
+        return [list(cached[query]) for query in queries]
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def stats(self) -> CacheStats:
+        return self._cache.stats()
+
+
+class RerankCache:
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self._cache = LRUCache(maxsize, ttl)
+
+    def predict(
+        self, query: str, candidates: List[Tuple[int, str, str]]
+    ) -> Tuple[List[float], int]:
+        # candidates are (doc_chunks.id, file_name, content), only the pairs
+        # without a cached score are sent to the cross-encoder, in one batch.
+        # Also returns how many pairs the cross-encoder actually scored.
+        scores, predicted = self.predict_batch([(query, candidates)])
+        return scores[0], predicted[0]
+
+    def predict_batch(
+        self, requests: List[Tuple[str, List[Tuple[int, str, str]]]]
+    ) -> Tuple[List[List[float]], List[int]]:
+        # Same as predict() for several queries, with the uncached pairs of
+        # every query scored in a single cross-encoder batch, which the
+        # pairs of concurrent requests may join.
+        scores, keys, missing = [], [], []
+        for q, (query, candidates) in enumerate(requests):
+            query_hash = hashlib.sha256(query.encode("utf-8")).digest()
+            keys.append(
+                [
+                    (RERANK_MODEL_ID, query_hash, chunk_id)
+                    for chunk_id, _, _ in candidates
+                ]
+            )
+            scores.append([])
+            for i, key in enumerate(keys[q]):
+                entry = self._cache.get(key)
+                scores[q].append(entry[0] if entry is not None else None)
+                if entry is None:
+                    missing.append((q, i))
+
+        if missing:
+            predicted = rerank_batcher(
+                [(requests[q][0], requests[q][1][i][2]) for q, i in missing]
+            )
+            for (q, i), score in zip(missing, predicted):
+                scores[q][i] = float(score)
+                self._cache.set(keys[q][i], (scores[q][i], requests[q][1][i][1]))
+
+        counts = [0] * len(requests)
+        for q, _ in missing:
+            counts[q] += 1
+        return scores, counts
+
+    def evict_file(self, file_name: str):
+        self._cache.evict(lambda _, entry: entry[1] == file_name)
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def stats(self) -> CacheStats:
+        return self._cache.stats()
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str = EMBEDDING_MODEL_ID):
+        self.model_name = model_name
+
+    @staticmethod
+    def content_hash(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def embed_documents(
+        self, texts: List[str], connection: Connection
+    ) -> Tuple[List[List[float]], List[bool]]:
+        hashes = [self.content_hash(text) for text in texts]
+
+        with connection.cursor() as cur:
+            cached = self._lookup(cur, hashes)
+
+            missing = {}
+            for text, content_hash in zip(texts, hashes):
+                if content_hash not in cached:
+                    missing.setdefault(content_hash, text)
+
+            if missing:
+                missing_embeddings = get_embedding().embed_documents(
+                    list(missing.values())
+                )
+                computed = dict(zip(missing.keys(), missing_embeddings))
+                self._store(cur, computed)
+                cached.update(computed)
+
+        hits = [content_hash not in missing for content_hash in hashes]
+        return [list(cached[content_hash]) for content_hash in hashes], hits
+
+    def _lookup(self, cur: Cursor, hashes: List[bytes]) -> Dict[bytes, List[float]]:
+        cur.execute(
+            """
+            SELECT content_hash, embedding
+            FROM embedding_cache
+            WHERE model_name = %s AND content_hash = ANY(%s)
+            """,
+            (self.model_name, hashes),
+        )
+        return {
+            bytes(content_hash): cached_embedding.tolist()
+            for content_hash, cached_embedding in cur.fetchall()
+        }
+
+    def _store(self, cur: Cursor, embeddings: Dict[bytes, List[float]]):
+        cur.executemany(
+            """
+            INSERT INTO embedding_cache (content_hash, model_name, embedding)
+            VALUES (%s, %s, %s)
+            ON CONFLICT DO NOTHING
+            """,
+            [
+                (content_hash, self.model_name, Vector(cached_embedding))
+                for content_hash, cached_embedding in embeddings.items()
+            ],
+        )
+
+
+# Whole simulation results keyed by a fingerprint of everything a run depends
+# on: the graph, prompt and corpus versions (bumped by triggers on their
+# tables), the models and the run options. Entries of older versions or
+# models are purged as soon as a result is stored under newer ones, entries
+# of other run options stay valid.
+class RunCache:
+    def __init__(self, similarity: float, ttl: float):
+        self.similarity = similarity
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._saved_ms = 0.0
+
+    @staticmethod
+    def _hash(key: Any) -> str:
+        return hashlib.sha256(
+            json.dumps(key, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def _fingerprint(self, cur: Cursor, options: Dict[str, Any]) -> Tuple[str, str]:
+        # (version hash, fingerprint), the version hash covers everything
+        # shared by all run options.
+        cur.execute("SELECT scope, version FROM data_version ORDER BY scope")
+        versions = cur.fetchall()
+        version_hash = self._hash(
+            [versions, EMBEDDING_MODEL_ID, RERANK_MODEL_ID, LLM_MODEL, LLM_BASE_URL]
+        )
+        return version_hash, self._hash([version_hash, options])
+
+    def get(self, query: str, options: Dict[str, Any]) -> Optional[Result]:
+        start = time.perf_counter()
+        with pool.connection() as connection, connection.cursor() as cur:
+            _, fingerprint = self._fingerprint(cur, options)
+            cur.execute(
+                """
+                SELECT result, latency_ms
+                FROM run_cache
+                WHERE fingerprint = %s AND query = %s
+                  AND created_at > NOW() - make_interval(secs => %s)
+                ORDER BY created_at DESC
+                LIMIT 1
+                """,
+                (fingerprint, query, self.ttl),
+            )
+            row = cur.fetchone()
+            if row is None and self.similarity < 1:
+                query_vector = Vector(query_embedding_cache.embed_query(query))
+                cur.execute(
+                    """
+                    SELECT result, latency_ms
+                    FROM run_cache
+                    WHERE fingerprint = %s
+                      AND created_at > NOW() - make_interval(secs => %s)
+                      AND 1 - (query_embedding <=> %s) >= %s
+                    ORDER BY query_embedding <=> %s
+                    LIMIT 1
+                    """,
+                    (
+                        fingerprint,
+                        self.ttl,
+                        query_vector,
+                        self.similarity,
+                        query_vector,
+                    ),
+                )
+                row = cur.fetchone()
+
+        with self._lock:
+            if row is None:
+                self._misses += 1
+                return None
+            result, latency_ms = row
+            self._hits += 1
+            self._saved_ms += max(latency_ms - (time.perf_counter() - start) * 1000, 0)
+
+        return Result.model_validate(result).model_copy(
+            update={"query": query, "cached": True}
+        )
+
+    def set(
+        self, query: str, options: Dict[str, Any], result: Result, latency_ms: float
+    ):
+        with pool.connection() as connection, connection.cursor() as cur:
+            version_hash, fingerprint = self._fingerprint(cur, options)
+            cur.execute(
+                """
+                DELETE FROM run_cache
+                WHERE version_hash <> %s
+                   OR created_at <= NOW() - make_interval(secs => %s)
+                """,
+                (version_hash, self.ttl),
+            )
+            cur.execute(
+                """
+                INSERT INTO run_cache (version_hash, fingerprint, query, query_embedding, result, latency_ms)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                """,
+                (
+                    version_hash,
+                    fingerprint,
+                    query,
+                    Vector(query_embedding_cache.embed_query(query)),
+                    Json(result.model_dump(mode="json")),
+                    latency_ms,
+                ),
+            )
+
+    def invalidate(self):
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE TABLE run_cache")
+        conn.commit()
+
+    def stats(self) -> RunCacheStats:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM run_cache")
+            size = cur.fetchone()[0]
+        conn.commit()
+
+        with self._lock:
+            lookups = self._hits + self._misses
+            return RunCacheStats(
+                size=size,
+                hits=self._hits,
+                misses=self._misses,
+                hit_rate=self._hits / lookups if lookups else 0.0,
+                saved_ms=round(self._saved_ms, 2),
+            )
+
+
+# Responses of the decision agents keyed by the prompt, the model and its
+# sampling parameters. An in-process LRU per agent type sits in front of the
+# llm_cache table, which survives restarts and is shared by all workers.
+class LLMResponseCache:
+    def __init__(self, maxsize: int, ttl: Dict[str, float]):
+        self.ttl = ttl
+        self._memory = {
+            agent_type: LRUCache(maxsize, agent_ttl)
+            for agent_type, agent_ttl in ttl.items()
+        }
+        self._lock = threading.Lock()
+        self._persistent_hits = 0
+
+    @staticmethod
+    def key(prompt: str, model_name: str, sampling: Dict[str, Any]) -> bytes:
+        key = json.dumps([prompt, model_name, sampling], sort_keys=True)
+        return hashlib.sha256(key.encode("utf-8")).digest()
+
+    async def get(self, agent_type: str, key: bytes) -> Optional[str]:
+        response = self._memory[agent_type].get(key)
+        if response is not None:
+            return response
+
+        async with async_pool.connection() as aconn:
+            cur = await aconn.execute(
+                """
+                SELECT response
+                FROM llm_cache
+                WHERE key = %s
+                  AND created_at > NOW() - make_interval(secs => %s)
+                """,
+                (key, self.ttl[agent_type]),
+            )
+            row = await cur.fetchone()
+        if row is None:
+            return None
+
+        with self._lock:
+            self._persistent_hits += 1
+        self._memory[agent_type].set(key, row[0])
+        return row[0]
+
+    async def set(self, agent_type: str, key: bytes, response: str):
+        self._memory[agent_type].set(key, response)
+        async with async_pool.connection() as aconn:
+            await aconn.execute(
+                """
+                INSERT INTO llm_cache (key, agent_type, response)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (key) DO UPDATE
+                SET response = EXCLUDED.response, created_at = NOW()
+                """,
+                (key, agent_type, response),
+            )
+            await aconn.execute(
+                """
+                DELETE FROM llm_cache
+                WHERE agent_type = %s
+                  AND created_at <= NOW() - make_interval(secs => %s)
+                """,
+                (agent_type, self.ttl[agent_type]),
+            )
+
+    def invalidate(self):
+        for memory in self._memory.values():
+            memory.clear()
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE TABLE llm_cache")
+        conn.commit()
+
+    def stats(self) -> LLMCacheStats:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM llm_cache")
+            size = cur.fetchone()[0]
+        conn.commit()
+
+        memory_stats = [memory.stats() for memory in self._memory.values()]
+        memory_hits = sum(stats.hits for stats in memory_stats)
+        with self._lock:
+            persistent_hits = self._persistent_hits
+        # Every lookup first misses or hits the in-memory tier.
+        lookups = memory_hits + sum(stats.misses for stats in memory_stats)
+        hits = memory_hits + persistent_hits
+        return LLMCacheStats(
+            size=size,
+            memory_hits=memory_hits,
+            persistent_hits=persistent_hits,
+            misses=lookups - hits,
+            hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+        )
+
+
+query_embedding_cache = QueryEmbeddingCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+rerank_cache = RerankCache(RERANK_CACHE_SIZE, RERANK_CACHE_TTL)
+run_cache = RunCache(RUN_CACHE_SIMILARITY, RUN_CACHE_TTL)
+llm_cache = LLMResponseCache(LLM_CACHE_SIZE, LLM_CACHE_TTL)
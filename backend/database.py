@@ -1,12 +1,58 @@
 import os
 import psycopg
-from pgvector.psycopg import register_vector
-
-conn = psycopg.connect(
-    dbname=os.getenv("DB_NAME"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    host=os.getenv("DB_HOST"),
-    port=os.getenv("DB_PORT"),
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+from pgvector.psycopg import register_vector, register_vector_async
+
+# Connections of the async pool, used by the simulation so that runs waiting
+# on the database do not block the event loop.
+ASYNC_POOL_SIZE = int(os.getenv("ASYNC_POOL_SIZE", "10"))
+# Connections of the sync pool, used by code running in worker threads, which
+# must not share the global connection.
+POOL_SIZE = int(os.getenv("POOL_SIZE", "10"))
+
+
+def _connect_kwargs() -> dict:
+    return {
+        "dbname": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "host": os.getenv("DB_HOST"),
+        "port": os.getenv("DB_PORT"),
+    }
+
+
+def connect(autocommit: bool = False) -> psycopg.Connection:
+    connection = psycopg.connect(**_connect_kwargs(), autocommit=autocommit)
+    register_vector(connection)
+    return connection
+
+
+def _configure(connection: psycopg.Connection):
+    register_vector(connection)
+    # The type lookup opens a transaction, pooled connections must be idle.
+    connection.commit()
+
+
+async def _configure_async(connection: psycopg.AsyncConnection):
+    await register_vector_async(connection)
+    # The type lookup opens a transaction, pooled connections must be idle.
+    await connection.commit()
+
+
+conn = connect()
+# Both pools are opened and closed by the app lifespan. Connections commit
+# when returned, or roll back if the block raised.
+pool = ConnectionPool(
+    kwargs=_connect_kwargs(),
+    min_size=1,
+    max_size=POOL_SIZE,
+    configure=_configure,
+    open=False,
+)
+async_pool = AsyncConnectionPool(
+    kwargs=_connect_kwargs(),
+    min_size=1,
+    max_size=ASYNC_POOL_SIZE,
+    configure=_configure_async,
+    open=False,
 )
-register_vector(conn)
@@ -1,13 +1,61 @@
-import tempfile
-import pymupdf4llm
-from typing import List
-from pathlib import Path
+import os
+import json
+import base64
+import pymupdf
+import threading
+import multiprocessing
+from itertools import groupby, islice
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    List,
+    Dict,
+    Tuple,
+    Union,
+    Iterable,
+    Iterator,
+    Optional,
+    Callable,
+    TypeVar,
+)
+import numpy as np
+from psycopg import Connection, Cursor, sql
 from pgvector import Vector
 from datetime import datetime
 
-from database import conn
-from schema import Chunk, File
-from models import splitter, embedding
+from database import conn, pool
+from schema import (
+    Chunk,
+    ChunkPage,
+    EmbeddingEncoding,
+    File,
+    FileIngestResult,
+    SearchParams,
+)
+from models import get_splitter
+from cache import EmbeddingCache, query_embedding_cache, rerank_cache
+from pdf import iter_pages, pdf_to_pages
+from index import apply_search_params
+from retrieval import sync_mirror
+from neighbor import NEIGHBOR_K, refresh_neighbors
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "4"))
+CHUNK_PAGE_SIZE = int(os.getenv("CHUNK_PAGE_SIZE", "100"))
+
+# Called with the keyword arguments stage, pages_done, pages_total,
+# chunks_embedded and cache_hits (and chunks_reused / chunks_removed when
+# updating a file).
+ProgressCallback = Callable[..., None]
+# Runs on the writing connection right before each transaction commits and
+# returns whether the caller still owns the ingestion, a worker whose job was
+# reclaimed meanwhile rolls back instead.
+ClaimCheck = Callable[[Cursor], bool]
+T = TypeVar("T")
+
+embedding_cache = EmbeddingCache()
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
 
 
 def get_chunk_count() -> int:
@@ -25,44 +73,378 @@ def file_exists(file_name: str) -> bool:
         return cur.fetchone()[0]
 
 
-def add_file_to_db(file_name: str, file_bytes: bytes) -> None:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(file_bytes)
-        tmp.flush()
-        tmp_path = tmp.name
+def _iter_chunks(pages: Iterable[str]) -> Iterator[str]:
+    # The last chunk of a page may continue on the next one, so it is carried
+    # over and split again together with the following page.
+    carry = ""
+    for page in pages:
+        chunks = get_splitter().split_text(carry + page)
+        if not chunks:
+            continue
+        carry = chunks.pop()
+        yield from chunks
+
+    if carry:
+        yield carry
+
+
+def _iter_batches(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def _insert_chunks(
+    cur: Cursor,
+    file_name: str,
+    chunks: List[str],
+    embeddings: List[List[float]],
+    start_index: int = 0,
+) -> None:
+    for chunk_id, (chunk_content, chunk_embedding) in enumerate(
+        zip(chunks, embeddings), start=start_index
+    ):
+        cur.execute(
+            """
+            INSERT INTO doc_chunks (file_name, chunk_index, content, embedding)
+            VALUES (%s, %s, %s, %s);
+            """,
+            (file_name, chunk_id, chunk_content, chunk_embedding),
+        )
+
+
+def _copy_rows(cur: Cursor, rows: Iterable[Tuple[str, int, str, List[float]]]) -> None:
+    with cur.copy(
+        """
+        COPY doc_chunks (file_name, chunk_index, content, embedding)
+        FROM STDIN WITH (FORMAT BINARY)
+        """
+    ) as copy:
+        copy.set_types(["text", "int4", "text", "vector"])
+        for file_name, chunk_index, chunk_content, chunk_embedding in rows:
+            copy.write_row(
+                (file_name, chunk_index, chunk_content, Vector(chunk_embedding))
+            )
+
+
+def _copy_chunks(
+    cur: Cursor,
+    file_name: str,
+    chunks: List[str],
+    embeddings: List[List[float]],
+    start_index: int = 0,
+) -> None:
+    _copy_rows(
+        cur,
+        (
+            (file_name, chunk_id, chunk_content, chunk_embedding)
+            for chunk_id, (chunk_content, chunk_embedding) in enumerate(
+                zip(chunks, embeddings), start=start_index
+            )
+        ),
+    )
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_pool
+
+
+def _verify_claim(cur: Cursor, check_claim: Optional[ClaimCheck], file_name: str):
+    if check_claim is not None and not check_claim(cur):
+        raise RuntimeError(f"Ingestion of {file_name} was reclaimed by another worker")
+
+
+def add_file_to_db(
+    file_name: str,
+    file_bytes: bytes,
+    use_copy: bool = True,
+    connection: Optional[Connection] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    check_claim: Optional[ClaimCheck] = None,
+) -> None:
+    connection = connection or conn
+    write_chunks = _copy_chunks if use_copy else _insert_chunks
+    pages_done = 0
+    chunks_embedded = 0
+    cache_hits = 0
+
+    def report(stage: str):
+        if on_progress:
+            on_progress(
+                stage=stage,
+                pages_done=pages_done,
+                pages_total=pages_total,
+                chunks_embedded=chunks_embedded,
+                cache_hits=cache_hits,
+            )
+
+    def count_pages(pages: Iterable[str]) -> Iterator[str]:
+        nonlocal pages_done
+        for page in pages:
+            yield page
+            pages_done += 1
+
+    with pymupdf.open(stream=file_bytes, filetype="pdf") as doc:
+        pages_total = doc.page_count
+        chunks = _iter_chunks(count_pages(iter_pages(doc)))
+
+        try:
+            report("parsing")
+            # Each batch is committed on its own so that the first chunks become
+            # searchable while the rest of the document is still being parsed.
+            for batch in _iter_batches(chunks, EMBED_BATCH_SIZE):
+                report("embedding")
+                embeddings, hits = embedding_cache.embed_documents(batch, connection)
+                with connection.cursor() as cur:
+                    write_chunks(cur, file_name, batch, embeddings, chunks_embedded)
+                    _verify_claim(cur, check_claim, file_name)
+                connection.commit()
+                chunks_embedded += len(batch)
+                cache_hits += sum(hits)
+                report("parsing")
+        except Exception:
+            connection.rollback()
+            # The partial rows of a failed attempt are only removed while the
+            # caller still owns the file, they may be a new owner's by now.
+            with connection.cursor() as cur:
+                if check_claim is None or check_claim(cur):
+                    cur.execute(
+                        "DELETE FROM doc_chunks WHERE file_name = %s;", (file_name,)
+                    )
+            connection.commit()
+            raise
+
+    sync_mirror(connection)
+    refresh_neighbors(file_name, connection)
+    report("done")
+
+
+def add_files_to_db(
+    files: Dict[str, bytes],
+    connection: Optional[Connection] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    check_claim: Optional[ClaimCheck] = None,
+) -> List[FileIngestResult]:
+    connection = connection or conn
+    pool = _get_parse_pool()
+    futures = {
+        file_name: pool.submit(pdf_to_pages, file_bytes)
+        for file_name, file_bytes in files.items()
+    }
+
+    results: Dict[str, FileIngestResult] = {}
+    rows = []
+    for file_name, future in futures.items():
+        try:
+            pages = future.result()
+            chunks = list(_iter_chunks(pages))
+        except Exception as e:
+            results[file_name] = FileIngestResult(file_name=file_name, error=str(e))
+            continue
+
+        results[file_name] = FileIngestResult(
+            file_name=file_name, pages_total=len(pages), chunks_embedded=len(chunks)
+        )
+        rows.extend(
+            (file_name, chunk_index, chunk_content)
+            for chunk_index, chunk_content in enumerate(chunks)
+        )
+        if on_progress:
+            on_progress(stage="parsing")
 
     try:
-        content = pymupdf4llm.to_markdown(tmp_path)
-    finally:
-        Path(tmp_path).unlink(missing_ok=True)
+        # Chunks of all files share the embedding batches, so only the very
+        # last batch of the whole upload can be smaller than EMBED_BATCH_SIZE.
+        # Progress is reported after every batch, which also keeps the jobs
+        # of the upload from being reclaimed as stale.
+        embeddings, hits = [], []
+        contents = (chunk_content for _, _, chunk_content in rows)
+        for batch in _iter_batches(contents, EMBED_BATCH_SIZE):
+            batch_embeddings, batch_hits = embedding_cache.embed_documents(
+                batch, connection
+            )
+            connection.commit()
+            embeddings.extend(batch_embeddings)
+            hits.extend(batch_hits)
+            if on_progress:
+                on_progress(stage="embedding")
+    except Exception as e:
+        # The batches are shared, so every file still waiting for its
+        # embeddings fails with them.
+        connection.rollback()
+        for result in results.values():
+            if result.error is None:
+                result.error = str(e)
+        return [results[file_name] for file_name in files]
 
-    chunks = splitter.split_text(content)
-    embeddings = embedding.embed_documents(chunks)
+    for (file_name, _, _), hit in zip(rows, hits):
+        results[file_name].cache_hits += hit
 
-    with conn.cursor() as cur:
-        for chunk_id, (chunk_content, chunk_embedding) in enumerate(
-            zip(chunks, embeddings)
-        ):
+    # Each file is written in its own transaction, a file that cannot be
+    # stored (e.g. uploaded twice) does not fail the others.
+    written = zip(rows, embeddings)
+    for file_name, file_rows in groupby(written, key=lambda row: row[0][0]):
+        try:
+            with connection.transaction(), connection.cursor() as cur:
+                _copy_rows(
+                    cur,
+                    (
+                        (file_name, chunk_index, chunk_content, chunk_embedding)
+                        for (
+                            _,
+                            chunk_index,
+                            chunk_content,
+                        ), chunk_embedding in file_rows
+                    ),
+                )
+                _verify_claim(cur, check_claim, file_name)
+        except Exception as e:
+            results[file_name].error = str(e)
+
+    sync_mirror(connection)
+    for file_name, result in results.items():
+        if result.error is None:
+            refresh_neighbors(file_name, connection)
+    return [results[file_name] for file_name in files]
+
+
+def update_file_in_db(
+    file_name: str,
+    file_bytes: bytes,
+    connection: Optional[Connection] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    check_claim: Optional[ClaimCheck] = None,
+) -> None:
+    connection = connection or conn
+
+    def report(stage: str, **progress):
+        if on_progress:
+            on_progress(stage=stage, pages_total=pages_total, **progress)
+
+    with pymupdf.open(stream=file_bytes, filetype="pdf") as doc:
+        pages_total = doc.page_count
+        report("parsing")
+        chunks = list(_iter_chunks(iter_pages(doc)))
+
+    try:
+        with connection.cursor() as cur:
             cur.execute(
                 """
-                INSERT INTO doc_chunks (file_name, chunk_index, content, embedding)
-                VALUES (%s, %s, %s, %s);
+                SELECT id, content
+                FROM doc_chunks
+                WHERE file_name = %s
+                ORDER BY chunk_index
+                FOR UPDATE
                 """,
-                (file_name, chunk_id, chunk_content, chunk_embedding),
+                (file_name,),
             )
-    conn.commit()
+            existing: Dict[str, List[int]] = {}
+            for chunk_id, content in cur.fetchall():
+                existing.setdefault(content, []).append(chunk_id)
 
+            # Every new chunk whose text is already stored keeps its row and
+            # embedding, only the chunk index changes.
+            kept_ids, kept_indexes, added = [], [], []
+            for chunk_index, content in enumerate(chunks):
+                chunk_ids = existing.get(content)
+                if chunk_ids:
+                    kept_ids.append(chunk_ids.pop(0))
+                    kept_indexes.append(chunk_index)
+                else:
+                    added.append((chunk_index, content))
+            removed_ids = [chunk_id for ids in existing.values() for chunk_id in ids]
 
-def clear_file_in_db() -> None:
-    with conn.cursor() as cur:
-        cur.execute("TRUNCATE TABLE doc_chunks;")
-    conn.commit()
+            cur.execute("DELETE FROM doc_chunks WHERE id = ANY(%s);", (removed_ids,))
 
+            # (file_name, chunk_index) is unique, so kept rows are moved to
+            # negative indexes first to free every slot of the new numbering.
+            cur.execute(
+                "UPDATE doc_chunks SET chunk_index = -1 - chunk_index WHERE id = ANY(%s);",
+                (kept_ids,),
+            )
+            cur.execute(
+                """
+                UPDATE doc_chunks AS d
+                SET chunk_index = u.chunk_index
+                FROM unnest(%s::bigint[], %s::int[]) AS u(id, chunk_index)
+                WHERE d.id = u.id
+                """,
+                (kept_ids, kept_indexes),
+            )
 
-def delete_file_from_db(file_name: str) -> None:
-    with conn.cursor() as cur:
+            chunks_embedded = 0
+            cache_hits = 0
+            for batch in _iter_batches(added, EMBED_BATCH_SIZE):
+                report(
+                    "embedding",
+                    pages_done=pages_total,
+                    chunks_embedded=chunks_embedded,
+                    cache_hits=cache_hits,
+                    chunks_reused=len(kept_ids),
+                    chunks_removed=len(removed_ids),
+                )
+                embeddings, hits = embedding_cache.embed_documents(
+                    [content for _, content in batch], connection
+                )
+                _copy_rows(
+                    cur,
+                    (
+                        (file_name, chunk_index, content, chunk_embedding)
+                        for (chunk_index, content), chunk_embedding in zip(
+                            batch, embeddings
+                        )
+                    ),
+                )
+                chunks_embedded += len(batch)
+                cache_hits += sum(hits)
+            _verify_claim(cur, check_claim, file_name)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+    sync_mirror(connection)
+    refresh_neighbors(file_name, connection)
+
+    report(
+        "done",
+        pages_done=pages_total,
+        chunks_embedded=chunks_embedded,
+        cache_hits=cache_hits,
+        chunks_reused=len(kept_ids),
+        chunks_removed=len(removed_ids),
+    )
+
+
+def clear_file_in_db(connection: Optional[Connection] = None) -> None:
+    connection = connection or conn
+    with connection.cursor() as cur:
+        cur.execute("TRUNCATE TABLE doc_chunks CASCADE;")
+    connection.commit()
+    sync_mirror(connection)
+    rerank_cache.invalidate()
+
+
+def delete_file_from_db(
+    file_name: str, connection: Optional[Connection] = None
+) -> None:
+    connection = connection or conn
+    with connection.cursor() as cur:
         cur.execute("DELETE FROM doc_chunks WHERE file_name = %s;", (file_name,))
-    conn.commit()
+    connection.commit()
+    sync_mirror(connection)
+    # With NEIGHBOR_SCOPE=global this reloads every embedding to repair the
+    # lists that pointed at the deleted chunks, so it stays on the caller's
+    # connection and thread.
+    refresh_neighbors(connection=connection)
+    rerank_cache.evict_file(file_name)
 
 
 def get_all_files_in_db() -> List[File]:
@@ -86,51 +468,202 @@ def get_all_files_in_db() -> List[File]:
     return files
 
 
-def get_all_chunks_of_file(file_name: str) -> List[Chunk]:
+def _encode_cursor(key: Dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Dict:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _encode_embedding(
+    embedding: np.ndarray, encoding: EmbeddingEncoding
+) -> Union[List[float], str]:
+    if encoding == "json":
+        return embedding.tolist()
+    dtype = "<f4" if encoding == "float32" else "<f2"
+    return base64.b64encode(embedding.astype(dtype).tobytes()).decode()
+
+
+def _count_chunks(cur: Cursor, file_name: str) -> int:
+    cur.execute("SELECT COUNT(*) FROM doc_chunks WHERE file_name = %s", (file_name,))
+    return cur.fetchone()[0]
+
+
+def get_chunks_of_file(
+    file_name: str,
+    cursor: Optional[str] = None,
+    limit: int = CHUNK_PAGE_SIZE,
+    include_embedding: bool = False,
+    encoding: EmbeddingEncoding = "float32",
+) -> ChunkPage:
+    after = _decode_cursor(cursor)["index"] if cursor else -1
+    columns = sql.SQL(", embedding" if include_embedding else "")
     with conn.cursor() as cur:
+        # One row more than the page tells whether there is a next page.
         cur.execute(
-            """
-            SELECT chunk_index, content, embedding
-            FROM doc_chunks
-            WHERE file_name = %s
-            ORDER BY chunk_index
-            """,
-            (file_name,),
+            sql.SQL(
+                """
+                SELECT chunk_index, content{columns}
+                FROM doc_chunks
+                WHERE file_name = %s AND chunk_index > %s
+                ORDER BY chunk_index
+                LIMIT %s
+                """
+            ).format(columns=columns),
+            (file_name, after, limit + 1),
         )
-        chunks = [
-            Chunk(index=index, content=content, embedding=embedding)
-            for index, content, embedding in cur.fetchall()
-        ]
-    return chunks
+        rows = cur.fetchall()
+        total = _count_chunks(cur, file_name)
+
+    chunks = [
+        Chunk(
+            index=row[0],
+            content=row[1],
+            embedding=(
+                _encode_embedding(row[2], encoding) if include_embedding else None
+            ),
+        )
+        for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = _encode_cursor({"index": chunks[-1].index})
+    return ChunkPage(
+        chunks=chunks,
+        total=total,
+        next_cursor=next_cursor,
+        embedding_encoding=encoding if include_embedding else None,
+    )
 
 
-def get_all_chunks_with_score(file_name: str, query: str) -> List[Chunk]:
-    query_embedding = embedding.embed_query(query)
+def get_chunks_with_score(
+    file_name: str,
+    query: str,
+    search_params: Optional[SearchParams] = None,
+    cursor: Optional[str] = None,
+    limit: int = CHUNK_PAGE_SIZE,
+    include_embedding: bool = False,
+    encoding: EmbeddingEncoding = "float32",
+) -> ChunkPage:
+    query_embedding = query_embedding_cache.embed_query(query)
     query_vector = Vector(query_embedding)
+    # Keyset on (distance, chunk_index): distances round-trip exactly through
+    # JSON, so the next page resumes right after the last row returned. The
+    # distance is not indexed, so every page still scores all chunks of the
+    # file and keeps the best limit + 1; a page costs the same at any depth,
+    # proportional to the size of the file rather than to the page.
+    if cursor:
+        key = _decode_cursor(cursor)
+        after = (key["distance"], key["index"])
+    else:
+        after = (float("-inf"), -1)
+    columns = sql.SQL(", embedding" if include_embedding else "")
+
+    # Runs in the threadpool, so it borrows a pooled connection rather than
+    # sharing the global one.
+    with pool.connection() as connection, connection.cursor() as cur:
+        apply_search_params(cur, search_params)
+        total = _count_chunks(cur, file_name)
+        # One row more than the page tells whether there is a next page.
+        cur.execute(
+            sql.SQL(
+                """
+                SELECT chunk_index, content, distance{columns}
+                FROM (
+                    SELECT *, embedding <=> %s AS distance
+                    FROM doc_chunks
+                    WHERE file_name = %s
+                ) AS scored
+                WHERE (distance, chunk_index) > (%s, %s)
+                ORDER BY distance, chunk_index
+                LIMIT %s
+                """
+            ).format(columns=columns),
+            (query_vector, file_name, *after, limit + 1),
+        )
+        rows = cur.fetchall()
+
+    chunks = [
+        Chunk(
+            index=row[0],
+            content=row[1],
+            embedding=(
+                _encode_embedding(row[3], encoding) if include_embedding else None
+            ),
+            score=round(1 - row[2], 2),
+        )
+        for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        index, _, distance = rows[limit - 1][:3]
+        next_cursor = _encode_cursor({"distance": distance, "index": index})
+    return ChunkPage(
+        chunks=chunks,
+        total=total,
+        next_cursor=next_cursor,
+        embedding_encoding=encoding if include_embedding else None,
+    )
+
+
+def get_chunk(
+    file_name: str, chunk_index: int, encoding: EmbeddingEncoding = "json"
+) -> Optional[Chunk]:
     with conn.cursor() as cur:
         cur.execute(
             """
-            SELECT chunk_index, content, embedding, 1 - (embedding <=> %s) AS score
+            SELECT content, embedding
             FROM doc_chunks
-            WHERE file_name = %s
-            ORDER BY score DESC
+            WHERE file_name = %s AND chunk_index = %s
             """,
-            (query_vector, file_name),
+            (file_name, chunk_index),
         )
-        chunks = [
-            Chunk(
-                index=index,
-                content=content,
-                embedding=embedding,
-                score=round(score, 2),
-            )
-            for index, content, embedding, score in cur.fetchall()
-        ]
-    return chunks
+        row = cur.fetchone()
+    if row is None:
+        return None
+    content, embedding = row
+    return Chunk(
+        index=chunk_index,
+        content=content,
+        embedding=_encode_embedding(embedding, encoding),
+    )
 
 
 def get_similar_chunks(file_name: str, chunk_index: int) -> List[Chunk]:
     with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT neighbor.file_name, neighbor.chunk_index, neighbor.content,
+                   chunk_neighbor.score
+            FROM doc_chunks AS chunk
+            JOIN chunk_neighbor ON chunk_neighbor.chunk_id = chunk.id
+            JOIN doc_chunks AS neighbor ON neighbor.id = chunk_neighbor.neighbor_id
+            WHERE chunk.file_name = %s AND chunk.chunk_index = %s
+            ORDER BY chunk_neighbor.rank
+            """,
+            (file_name, chunk_index),
+        )
+        rows = cur.fetchall()
+        if rows:
+            return [
+                Chunk(
+                    index=index,
+                    content=content,
+                    score=round(score, 2),
+                    file_name=neighbor_file_name,
+                )
+                for neighbor_file_name, index, content, score in rows
+            ]
+
+        # Chunks ingested before the neighbour graph existed fall back to an
+        # exact scan over the file. The materialised CTE keeps the planner from
+        # walking the ANN index and filtering its candidates by file, which
+        # returns fewer than NEIGHBOR_K chunks once the file is a small part of
+        # the corpus.
         cur.execute(
             """
             SELECT embedding
@@ -144,21 +677,22 @@ def get_similar_chunks(file_name: str, chunk_index: int) -> List[Chunk]:
 
         cur.execute(
             """
-            SELECT chunk_index, content, embedding, 1 - (embedding <=> %s) AS score
-            FROM doc_chunks
-            WHERE file_name = %s AND chunk_index != %s
-            ORDER BY score DESC
-            LIMIT 3
+            WITH file_chunks AS MATERIALIZED (
+                SELECT chunk_index, content, embedding
+                FROM doc_chunks
+                WHERE file_name = %s AND chunk_index != %s
+            )
+            SELECT chunk_index, content, 1 - (embedding <=> %s) AS score
+            FROM file_chunks
+            ORDER BY embedding <=> %s
+            LIMIT %s
             """,
-            (target_vector, file_name, chunk_index),
+            (file_name, chunk_index, target_vector, target_vector, NEIGHBOR_K),
         )
         chunks = [
             Chunk(
-                index=index,
-                content=content,
-                embedding=embedding,
-                score=round(score, 2),
+                index=index, content=content, score=round(score, 2), file_name=file_name
             )
-            for index, content, embedding, score in cur.fetchall()
+            for index, content, score in cur.fetchall()
         ]
     return chunks
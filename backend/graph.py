@@ -1,16 +1,21 @@
 import os
 import json
+import time
+import asyncio
+import threading
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph
 from langgraph.graph.state import CompiledStateGraph
-from typing import TypedDict, Dict, Any
+from langchain_core.runnables import RunnableConfig
+from typing import TypedDict, Dict, Any, List, Optional, Tuple
 from psycopg import Cursor
 from psycopg.types.json import Json
 
-from schema import AgentNode, Edge, Condition, Graph
-from database import conn
-from models import model
+from schema import AgentNode, Edge, Condition, Graph, RuntimeCacheStats
+from database import conn, async_pool
+from models import get_chat_model
 from prompt import PromptManager
+from cache import llm_cache
 
 load_dotenv()
 
@@ -24,8 +29,30 @@ class State(TypedDict, total=False):
     data: Dict[str, Any]
 
 
-def _classifier_agent(state: State, output_field: str, config: dict) -> dict:
-    text = state["query"]
+async def _decide(agent_type: str, prompt: str, use_cache: bool) -> Tuple[dict, bool]:
+    # The decision prompts are deterministic in the query and the node's
+    # config, so with the same model and sampling parameters a cached
+    # response is as good as a new one. Only responses that parse are cached.
+    model = get_chat_model()
+    if use_cache:
+        key = llm_cache.key(
+            prompt,
+            model.model_name,
+            {"temperature": model.temperature, "max_tokens": model.max_tokens},
+        )
+        content = await llm_cache.get(agent_type, key)
+        if content is not None:
+            return json.loads(content), True
+
+    content = (await model.ainvoke(prompt)).content
+    response = json.loads(content)
+    if use_cache:
+        await llm_cache.set(agent_type, key, content)
+    return response, False
+
+
+async def _classifier_agent(query: str, config: dict, use_cache: bool = False) -> dict:
+    text = query
     options = config["options"]
 
     prompt = f"""
@@ -40,16 +67,15 @@ def _classifier_agent(state: State, output_field: str, config: dict) -> dict:
     }}
     """
 
-    response = json.loads(model.invoke(prompt).content)
+    response, cached = await _decide("classifier", prompt, use_cache)
     value = response["value"]
     reason = response.get("reason", "")
 
-    state.setdefault("data", {})[output_field] = value
-    return {"value": value, "reason": reason}
+    return {"value": value, "reason": reason, "cached": cached}
 
 
-def _gatekeeper_agent(state: State, output_field: str, config: dict) -> dict:
-    text = state["query"]
+async def _gatekeeper_agent(query: str, config: dict, use_cache: bool = False) -> dict:
+    text = query
     question = config["question"]
 
     prompt = f"""
@@ -64,16 +90,15 @@ def _gatekeeper_agent(state: State, output_field: str, config: dict) -> dict:
     }}
     """
 
-    response = json.loads(model.invoke(prompt).content)
+    response, cached = await _decide("gatekeeper", prompt, use_cache)
     value = bool(response["value"])
     reason = response.get("reason", "")
 
-    state.setdefault("data", {})[output_field] = value
-    return {"value": value, "reason": reason}
+    return {"value": value, "reason": reason, "cached": cached}
 
 
-def _scorer_agent(state: State, output_field: str, config: dict) -> dict:
-    text = state["query"]
+async def _scorer_agent(query: str, config: dict, use_cache: bool = False) -> dict:
+    text = query
     instruction = config["instruction"]
 
     prompt = f"""
@@ -88,12 +113,11 @@ def _scorer_agent(state: State, output_field: str, config: dict) -> dict:
     }}
     """
 
-    response = json.loads(model.invoke(prompt).content)
+    response, cached = await _decide("scorer", prompt, use_cache)
     value = float(response["value"])
     reason = response.get("reason", "")
 
-    state.setdefault("data", {})[output_field] = value
-    return {"value": value, "reason": reason}
+    return {"value": value, "reason": reason, "cached": cached}
 
 
 class GraphManager:
@@ -104,6 +128,14 @@ class GraphManager:
             "scorer": _scorer_agent,
         }
         self._prompt_manager = PromptManager()
+        # (data versions, graph, compiled runtime) of the last compile.
+        self._runtime: Optional[Tuple[Tuple, Graph, CompiledStateGraph]] = None
+        self._runtime_lock = asyncio.Lock()
+        self._stats_lock = threading.Lock()
+        self._runtime_hits = 0
+        self._runtime_compiles = 0
+        self._hit_ms = 0.0
+        self._compile_ms = 0.0
 
     def set_entry(self, node_name: str):
         with conn.cursor() as cur:
@@ -122,8 +154,8 @@ class GraphManager:
         with conn.cursor() as cur:
             cur.execute(
                 """
-                INSERT INTO agent_node (name, agent_type, output_field, decision_config, prompt_name)
-                VALUES (%s, %s, %s, %s, %s)
+                INSERT INTO agent_node (name, agent_type, output_field, decision_config, prompt_name, retrieval_config)
+                VALUES (%s, %s, %s, %s, %s, %s)
                 """,
                 (
                     node.name,
@@ -135,6 +167,11 @@ class GraphManager:
                         else None
                     ),
                     node.prompt_name,
+                    (
+                        Json(node.retrieval_config.model_dump())
+                        if node.retrieval_config
+                        else None
+                    ),
                 ),
             )
         conn.commit()
@@ -149,7 +186,7 @@ class GraphManager:
             cur.execute(
                 """
                 UPDATE agent_node
-                SET name = %s, agent_type = %s, output_field = %s, decision_config = %s, prompt_name = %s
+                SET name = %s, agent_type = %s, output_field = %s, decision_config = %s, prompt_name = %s, retrieval_config = %s
                 WHERE name = %s
                 """,
                 (
@@ -162,6 +199,11 @@ class GraphManager:
                         else None
                     ),
                     node.prompt_name,
+                    (
+                        Json(node.retrieval_config.model_dump())
+                        if node.retrieval_config
+                        else None
+                    ),
                     node_name,
                 ),
             )
@@ -234,51 +276,170 @@ class GraphManager:
         conn.commit()
 
     def get_graph(self) -> Graph:
+        with conn.cursor() as cur:
+            cur.execute("SELECT * FROM agent_node")
+            node_rows = cur.fetchall()
+            cur.execute("SELECT * FROM edge")
+            edge_rows = cur.fetchall()
+        return self._build_graph(node_rows, edge_rows)
+
+    async def aget_graph(self) -> Graph:
+        async with async_pool.connection() as aconn:
+            cur = await aconn.execute("SELECT * FROM agent_node")
+            node_rows = await cur.fetchall()
+            cur = await aconn.execute("SELECT * FROM edge")
+            edge_rows = await cur.fetchall()
+        return self._build_graph(node_rows, edge_rows)
+
+    def _build_graph(self, node_rows: List[Tuple], edge_rows: List[Tuple]) -> Graph:
         entry_node = ""
         nodes = {}
         edges = {}
-        with conn.cursor() as cur:
-            cur.execute("SELECT * FROM agent_node")
-            for (
-                name,
-                agent_type,
-                is_entry,
-                output_field,
-                decision_config,
-                prompt_name,
-            ) in cur.fetchall():
-                if is_entry:
-                    entry_node = name
-                nodes[name] = AgentNode(
-                    name=name,
-                    agent_type=agent_type,
-                    output_field=output_field,
-                    decision_config=decision_config,
-                    prompt_name=prompt_name,
-                )
+        for (
+            name,
+            agent_type,
+            is_entry,
+            output_field,
+            decision_config,
+            prompt_name,
+            retrieval_config,
+        ) in node_rows:
+            if is_entry:
+                entry_node = name
+            nodes[name] = AgentNode(
+                name=name,
+                agent_type=agent_type,
+                output_field=output_field,
+                decision_config=decision_config,
+                prompt_name=prompt_name,
+                retrieval_config=retrieval_config,
+            )
 
-            cur.execute("SELECT * FROM edge")
-            for src_node, dest_node, operator, value in cur.fetchall():
-                edges.setdefault(src_node, []).append(
-                    Edge(
-                        src_node=src_node,
-                        dest_node=dest_node,
-                        condition=(
-                            Condition(operator=operator, value=value)
-                            if operator is not None and value is not None
-                            else None
-                        ),
-                    )
+        for src_node, dest_node, operator, value in edge_rows:
+            edges.setdefault(src_node, []).append(
+                Edge(
+                    src_node=src_node,
+                    dest_node=dest_node,
+                    condition=(
+                        Condition(operator=operator, value=value)
+                        if operator is not None and value is not None
+                        else None
+                    ),
                 )
+            )
 
         return Graph(entry_node=entry_node, nodes=nodes, edges=edges)
 
-    def compile_graph(self) -> CompiledStateGraph:
-        graph = self.get_graph()
+    async def get_runtime(self) -> Tuple[Graph, CompiledStateGraph]:
+        # The compiled runtime is reused for as long as the graph and prompt
+        # versions stay the same. Triggers bump them on every change to
+        # agent_node, edge or prompt, so a change made through any worker
+        # recompiles on the next run.
+        start = time.perf_counter()
+        async with async_pool.connection() as aconn:
+            cur = await aconn.execute(
+                """
+                SELECT scope, version
+                FROM data_version
+                WHERE scope IN ('graph', 'prompt')
+                ORDER BY scope
+                """
+            )
+            versions = tuple(await cur.fetchall())
+
+        async with self._runtime_lock:
+            if self._runtime is not None and self._runtime[0] == versions:
+                _, graph, runtime = self._runtime
+                hit = True
+            else:
+                graph = await self.aget_graph()
+                prompts = await self._prompt_manager.get_prompt_rows(
+                    [
+                        node.prompt_name
+                        for node in graph.nodes.values()
+                        if node.prompt_name
+                    ]
+                )
+                runtime = self.compile_graph(graph, prompts)
+                self._runtime = (versions, graph, runtime)
+                hit = False
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        # The counters have their own lock so that runtime_stats, which cannot
+        # await the runtime lock, reads them consistently.
+        with self._stats_lock:
+            if hit:
+                self._runtime_hits += 1
+                self._hit_ms += elapsed_ms
+            else:
+                self._runtime_compiles += 1
+                self._compile_ms += elapsed_ms
+        return graph, runtime
+
+    def speculate(
+        self, graph: Graph, query: str, use_cache: bool, limit: int = 0
+    ) -> Dict[str, asyncio.Task]:
+        # Decision agents only read the query, never an earlier agent's
+        # output, so every one the run may reach can be started right away.
+        # Nodes closer to the entry are more likely to run and come first,
+        # limit keeps only that many of them (0 for all). The node callbacks
+        # await these tasks instead of calling the model themselves, and the
+        # edge routers cancel the ones a chosen edge can no longer reach.
+        reachable = [
+            graph.nodes[node_name]
+            for node_name in self._reachable(graph, graph.entry_node)
+            if node_name in graph.nodes
+            and graph.nodes[node_name].agent_type in self._agent_registry
+        ]
+
+        return {
+            node.name: asyncio.create_task(
+                self._agent_registry[node.agent_type](
+                    query, node.decision_config.model_dump(), use_cache=use_cache
+                )
+            )
+            for node in (reachable[:limit] if limit else reachable)
+        }
+
+    @staticmethod
+    def _reachable(graph: Graph, start: str) -> List[str]:
+        # Nodes reachable from start including itself, breadth first.
+        reachable = [start]
+        visited = {start}
+        for node_name in reachable:
+            for edge in graph.edges.get(node_name, []):
+                if edge.dest_node not in visited:
+                    visited.add(edge.dest_node)
+                    reachable.append(edge.dest_node)
+        return reachable
+
+    def runtime_stats(self) -> RuntimeCacheStats:
+        with self._stats_lock:
+            hits, compiles = self._runtime_hits, self._runtime_compiles
+            hit_ms, compile_ms = self._hit_ms, self._compile_ms
+        lookups = hits + compiles
+        return RuntimeCacheStats(
+            hits=hits,
+            compiles=compiles,
+            hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+            mean_hit_ms=round(hit_ms / hits, 3) if hits else 0.0,
+            mean_compile_ms=round(compile_ms / compiles, 3) if compiles else 0.0,
+        )
+
+    def compile_graph(
+        self, graph: Graph, prompts: Dict[str, Tuple[str, dict, bool]]
+    ) -> CompiledStateGraph:
+        # prompts are the rows of the responders' prompts, read once here
+        # instead of by every run.
         state_graph = StateGraph(State)
 
         for node in graph.nodes.values():
-            state_graph.add_node(node.name, self._node_callback(node=node))
+            state_graph.add_node(
+                node.name,
+                self._node_callback(
+                    node=node, prompt_row=prompts.get(node.prompt_name)
+                ),
+            )
 
         for node_name in graph.edges:
             state_graph.add_conditional_edges(
@@ -291,14 +452,28 @@ class GraphManager:
     def reset_graph(self):
         with conn.cursor() as cur:
             cur.execute("CALL sp_set_default_graph();")
+        conn.commit()
 
     def _edge_router(self, graph: Graph, node_name: str):
         edges = graph.edges.get(node_name, [])
         node = graph.nodes[node_name]
         output_field = node.output_field if node.agent_type != "responder" else None
+        reachable = {
+            edge.dest_node: set(self._reachable(graph, edge.dest_node))
+            for edge in edges
+        }
 
-        def router(state: State):
+        def cancel_unreachable(config: RunnableConfig, next_node: str):
+            # Speculated decisions the chosen edge can no longer reach are
+            # cancelled now, not after the responder has run.
+            speculations = config["configurable"].get("speculations", {})
+            for node_name, task in speculations.items():
+                if node_name not in reachable.get(next_node, ()):
+                    task.cancel()
+
+        async def router(state: State, config: RunnableConfig):
             if not output_field:
+                cancel_unreachable(config, "__end__")
                 return "__end__"
 
             value = state.get("data", {}).get(output_field)
@@ -312,8 +487,10 @@ class GraphManager:
                                 "matched_condition": f"{edge.condition.operator} {edge.condition.value}",
                             }
                         )
+                    cancel_unreachable(config, edge.dest_node)
                     return edge.dest_node
 
+            cancel_unreachable(config, "__end__")
             return "__end__"
 
         return router
@@ -339,34 +516,53 @@ class GraphManager:
 
         return False
 
-    def _node_callback(self, node: AgentNode):
+    def _node_callback(
+        self, node: AgentNode, prompt_row: Optional[Tuple[str, dict, bool]] = None
+    ):
         node_name = node.name
         agent_type = node.agent_type
 
-        def callback(state: State):
+        # Async nodes, the runtime has to be run with ainvoke().
+        async def callback(state: State, config: RunnableConfig):
             trace = {"agent": node_name, "agent_type": agent_type}
 
             if agent_type in ["classifier", "gatekeeper", "scorer"]:
-                agent_fn = self._agent_registry[agent_type]
-                result = agent_fn(
-                    state, node.output_field, node.decision_config.model_dump()
+                speculation = (
+                    config["configurable"].get("speculations", {}).get(node_name)
                 )
+                if speculation is not None:
+                    result = await speculation
+                else:
+                    agent_fn = self._agent_registry[agent_type]
+                    result = await agent_fn(
+                        state["query"],
+                        node.decision_config.model_dump(),
+                        use_cache=config["configurable"].get("use_llm_cache", False),
+                    )
 
+                state.setdefault("data", {})[node.output_field] = result["value"]
                 trace.update(
                     {
                         "output_field": node.output_field,
                         "output_value": result["value"],
                         "reason": result["reason"],
+                        "cached": result["cached"],
                     }
                 )
 
             elif agent_type == "responder":
-                prompt = self._prompt_manager.get_formatted_prompt(
-                    prompt_name=node.prompt_name,
+
+                async def get_context() -> str:
+                    retrieve_context = config["configurable"]["retrieve_context"]
+                    state["context"] = await retrieve_context(node.retrieval_config)
+                    return state["context"]
+
+                prompt = await self._prompt_manager.format_prompt(
+                    prompt_row=prompt_row,
                     query=state["query"],
-                    context=state["context"],
+                    get_context=get_context,
                 )
-                response = model.invoke(prompt).content
+                response = (await get_chat_model().ainvoke(prompt)).content
 
                 trace.update({"prompt": prompt, "output": response})
 
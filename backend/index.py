@@ -0,0 +1,147 @@
+import os
+from typing import Optional, Tuple
+from psycopg import Connection, Cursor, sql
+
+from database import conn, connect
+from schema import IndexConfig, SearchParams, VectorIndex, Quantization
+from models import EMBEDDING_DIM
+
+INDEX_NAME = "doc_chunks_embedding_idx"
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "1"))
+# Representation searched for candidates, which are then rescored with the
+# full-precision embedding. Must match the quantization of the built index.
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+QUANTIZED_OVERSAMPLE = int(os.getenv("QUANTIZED_OVERSAMPLE", "4"))
+
+
+def apply_search_params(cur: Cursor, search_params: Optional[SearchParams]) -> None:
+    # Both settings are always written so that a previous query on the same
+    # transaction never leaks its values into this one.
+    search_params = search_params or SearchParams()
+    cur.execute(
+        """
+        SELECT set_config('hnsw.ef_search', %s, true),
+               set_config('ivfflat.probes', %s, true)
+        """,
+        (
+            str(search_params.ef_search or HNSW_EF_SEARCH),
+            str(search_params.probes or IVFFLAT_PROBES),
+        ),
+    )
+
+
+def quantized_expression(
+    quantization: Quantization, query: sql.Composable = sql.SQL("%(query)s")
+) -> Tuple[sql.Composable, sql.Composable, sql.Composable, sql.Composable]:
+    # (indexed expression, operator class, distance operator, query expression)
+    # Queries have to use the exact indexed expression for the planner to use
+    # an expression index.
+    dim = sql.Literal(EMBEDDING_DIM)
+    if quantization == "halfvec":
+        return (
+            sql.SQL("(embedding::halfvec({}))").format(dim),
+            sql.SQL("halfvec_cosine_ops"),
+            sql.SQL("<=>"),
+            sql.SQL("{}::halfvec({})").format(query, dim),
+        )
+    if quantization == "binary":
+        return (
+            sql.SQL("(binary_quantize(embedding)::bit({}))").format(dim),
+            sql.SQL("bit_hamming_ops"),
+            sql.SQL("<~>"),
+            sql.SQL("binary_quantize({}::vector)::bit({})").format(query, dim),
+        )
+    if quantization == "none":
+        return (
+            sql.SQL("embedding"),
+            sql.SQL("vector_cosine_ops"),
+            sql.SQL("<=>"),
+            query,
+        )
+    raise ValueError(f"{quantization} quantization is not supported by pgvector")
+
+
+class IndexManager:
+    def get_index(
+        self, connection: Optional[Connection] = None
+    ) -> Optional[VectorIndex]:
+        with (connection or conn).cursor() as cur:
+            cur.execute(
+                """
+                SELECT am.amname, c.reloptions, pg_relation_size(c.oid), pg_get_indexdef(c.oid)
+                FROM pg_class c
+                JOIN pg_am am ON am.oid = c.relam
+                WHERE c.relname = %s AND c.relkind = 'i'
+                """,
+                (INDEX_NAME,),
+            )
+            row = cur.fetchone()
+
+        if not row:
+            return None
+
+        method, reloptions, size_bytes, definition = row
+        options = dict(option.split("=", 1) for option in reloptions or [])
+        if "binary_quantize" in definition:
+            quantization = "binary"
+        elif "halfvec" in definition:
+            quantization = "halfvec"
+        else:
+            quantization = "none"
+        return VectorIndex(
+            name=INDEX_NAME,
+            method=method,
+            options=options,
+            size_bytes=size_bytes,
+            definition=definition,
+            quantization=quantization,
+        )
+
+    def build_index(self, config: IndexConfig) -> VectorIndex:
+        if config.method == "hnsw":
+            options = sql.SQL("m = {}, ef_construction = {}").format(
+                sql.Literal(config.m), sql.Literal(config.ef_construction)
+            )
+        else:
+            options = sql.SQL("lists = {}").format(sql.Literal(config.lists))
+        expression, opclass, _, _ = quantized_expression(
+            config.quantization or VECTOR_QUANTIZATION
+        )
+
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction, so the
+        # build uses its own autocommit connection and never blocks writers.
+        with connect(autocommit=True) as index_conn, index_conn.cursor() as cur:
+            if config.maintenance_work_mem:
+                cur.execute(
+                    "SELECT set_config('maintenance_work_mem', %s, false)",
+                    (config.maintenance_work_mem,),
+                )
+            cur.execute(
+                sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(
+                    sql.Identifier(INDEX_NAME)
+                )
+            )
+            cur.execute(
+                sql.SQL(
+                    "CREATE INDEX CONCURRENTLY {} ON doc_chunks USING {} ({} {}) WITH ({})"
+                ).format(
+                    sql.Identifier(INDEX_NAME),
+                    sql.SQL(config.method),
+                    expression,
+                    opclass,
+                    options,
+                )
+            )
+
+            # build_index runs in the threadpool, which must not use the
+            # global connection.
+            return self.get_index(index_conn)
+
+    def drop_index(self):
+        with connect(autocommit=True) as index_conn, index_conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(
+                    sql.Identifier(INDEX_NAME)
+                )
+            )
@@ -0,0 +1,124 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence, Tuple
+
+from schema import BatcherStats
+from models import get_embedding, get_reranking
+
+# How long the first call of a batch waits for others to join it, and the
+# most inputs a single forward pass may take.
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "5"))
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "128"))
+
+
+# Collects the calls of concurrent requests arriving within a short window
+# into one batched forward pass. A single worker thread owns the model, so
+# callers never contend for the shared module's threads either.
+class MicroBatcher:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[List[Any]], Sequence[Any]],
+        window_ms: float,
+        max_batch: int,
+    ):
+        self.name = name
+        self.fn = fn
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._calls = 0
+        self._inputs = 0
+        self._max_batch_size = 0
+        self._max_queue_depth = 0
+
+    def submit(self, inputs: List[Any]) -> Future:
+        future = Future()
+        if not inputs:
+            future.set_result([])
+            return future
+
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name=f"{self.name}-batcher", daemon=True
+                )
+                self._worker.start()
+            self._queue.put((list(inputs), future))
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return future
+
+    def __call__(self, inputs: List[Any]) -> List[Any]:
+        return self.submit(inputs).result()
+
+    def _collect(self) -> List[Tuple[List[Any], Future]]:
+        calls = [self._queue.get()]
+        size = len(calls[0][0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                call = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            calls.append(call)
+            size += len(call[0])
+        return calls
+
+    def _run(self):
+        while True:
+            calls = self._collect()
+            inputs = [item for call_inputs, _ in calls for item in call_inputs]
+            try:
+                outputs = list(self.fn(inputs))
+            except Exception as e:
+                for _, future in calls:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for call_inputs, future in calls:
+                future.set_result(outputs[offset : offset + len(call_inputs)])
+                offset += len(call_inputs)
+
+            with self._lock:
+                self._batches += 1
+                self._calls += len(calls)
+                self._inputs += len(inputs)
+                self._max_batch_size = max(self._max_batch_size, len(inputs))
+
+    def stats(self) -> BatcherStats:
+        with self._lock:
+            return BatcherStats(
+                queue_depth=self._queue.qsize(),
+                max_queue_depth=self._max_queue_depth,
+                batches=self._batches,
+                calls=self._calls,
+                inputs=self._inputs,
+                mean_batch_size=(
+                    round(self._inputs / self._batches, 2) if self._batches else 0.0
+                ),
+                max_batch_size=self._max_batch_size,
+            )
+
+
+embed_batcher = MicroBatcher(
+    "embed",
+    lambda texts: get_embedding().embed_documents(texts),
+    INFERENCE_BATCH_WINDOW_MS,
+    INFERENCE_MAX_BATCH,
+)
+rerank_batcher = MicroBatcher(
+    "rerank",
+    lambda pairs: get_reranking().predict(pairs).tolist(),
+    INFERENCE_BATCH_WINDOW_MS,
+    INFERENCE_MAX_BATCH,
+)
@@ -0,0 +1,377 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from typing import List, Dict, Optional
+from psycopg import Connection, Cursor, sql
+
+from database import conn, connect
+from schema import IngestJob
+from file import ClaimCheck, add_file_to_db, add_files_to_db, update_file_in_db
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "1.0"))
+INGEST_JOB_TIMEOUT = int(os.getenv("INGEST_JOB_TIMEOUT", "600"))
+
+logger = logging.getLogger(__name__)
+
+
+class JobManager:
+    def __init__(self):
+        self._stop_event = threading.Event()
+        self._workers: List[threading.Thread] = []
+
+    def job_pending(self, file_name: str) -> bool:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT EXISTS(
+                    SELECT 1 FROM ingest_job
+                    WHERE file_name = %s AND stage IN ('queued', 'parsing', 'embedding')
+                )
+                """,
+                (file_name,),
+            )
+            return cur.fetchone()[0]
+
+    def enqueue(self, file_name: str, file_bytes: bytes, mode: str = "add") -> int:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO ingest_job (file_name, file_bytes, mode)
+                VALUES (%s, %s, %s)
+                RETURNING id
+                """,
+                (file_name, file_bytes, mode),
+            )
+            job_id = cur.fetchone()[0]
+        conn.commit()
+        return job_id
+
+    def enqueue_batch(self, files: Dict[str, bytes]) -> Dict[str, int]:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                WITH batch AS (SELECT nextval('ingest_batch_seq') AS id)
+                INSERT INTO ingest_job (file_name, file_bytes, batch_id)
+                SELECT f.file_name, f.file_bytes, batch.id
+                FROM unnest(%s::text[], %s::bytea[]) AS f(file_name, file_bytes), batch
+                RETURNING id, file_name
+                """,
+                (list(files.keys()), list(files.values())),
+            )
+            job_ids = {file_name: job_id for job_id, file_name in cur.fetchall()}
+        conn.commit()
+        return job_ids
+
+    def get_job(self, job_id: int) -> Optional[IngestJob]:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, file_name, mode, stage, pages_done, pages_total,
+                    chunks_embedded, cache_hits, chunks_reused, chunks_removed, error
+                FROM ingest_job
+                WHERE id = %s
+                """,
+                (job_id,),
+            )
+            row = cur.fetchone()
+
+        if not row:
+            return None
+
+        (
+            id,
+            file_name,
+            mode,
+            stage,
+            pages_done,
+            pages_total,
+            chunks_embedded,
+            cache_hits,
+            chunks_reused,
+            chunks_removed,
+            error,
+        ) = row
+        return IngestJob(
+            id=id,
+            file_name=file_name,
+            mode=mode,
+            stage=stage,
+            pages_done=pages_done,
+            pages_total=pages_total,
+            chunks_embedded=chunks_embedded,
+            cache_hits=cache_hits,
+            chunks_reused=chunks_reused,
+            chunks_removed=chunks_removed,
+            cache_hit_rate=(
+                round(cache_hits / chunks_embedded, 4) if chunks_embedded else 0.0
+            ),
+            error=error,
+        )
+
+    def start(self, workers: int = INGEST_WORKERS):
+        self._stop_event.clear()
+        for i in range(workers):
+            worker = threading.Thread(
+                target=self._work, name=f"ingest-worker-{i}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        self._stop_event.set()
+        for worker in self._workers:
+            worker.join()
+        self._workers.clear()
+
+    def _work(self):
+        # Job bookkeeping runs in autocommit mode on its own connection so that
+        # progress is visible immediately and never mixes with the ingestion
+        # transactions.
+        with connect(autocommit=True) as job_conn, connect() as ingest_conn:
+            while not self._stop_event.is_set():
+                try:
+                    claimed = self._claim(job_conn)
+                except Exception:
+                    logger.exception("Failed to claim ingestion job")
+                    claimed = None
+
+                if not claimed:
+                    self._stop_event.wait(INGEST_POLL_INTERVAL)
+                    continue
+
+                self._process(job_conn, ingest_conn, *claimed)
+
+    def _claim(self, job_conn: Connection) -> Optional[tuple]:
+        # Jobs whose worker stopped reporting progress are reclaimed as well.
+        # Jobs uploaded together are claimed together so that they can share
+        # embedding batches. Returns the claim token and the claimed jobs.
+        claim_token = uuid.uuid4()
+        with job_conn.transaction(), job_conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, batch_id FROM ingest_job
+                WHERE stage = 'queued'
+                    OR (
+                        stage IN ('parsing', 'embedding')
+                        AND updated_at < NOW() - make_interval(secs => %s)
+                    )
+                ORDER BY id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+                """,
+                (INGEST_JOB_TIMEOUT,),
+            )
+            row = cur.fetchone()
+            if not row:
+                return None
+
+            job_id, batch_id = row
+            job_ids = [job_id]
+            if batch_id is not None:
+                cur.execute(
+                    """
+                    SELECT id FROM ingest_job
+                    WHERE batch_id = %s AND stage = 'queued' AND id != %s
+                    ORDER BY id
+                    FOR UPDATE SKIP LOCKED
+                    """,
+                    (batch_id, job_id),
+                )
+                job_ids += [id for (id,) in cur.fetchall()]
+
+            cur.execute(
+                """
+                UPDATE ingest_job
+                SET stage = 'parsing', attempts = attempts + 1,
+                    claim_token = %s, updated_at = NOW()
+                WHERE id = ANY(%s)
+                RETURNING id, file_name, file_bytes, attempts, mode
+                """,
+                (claim_token, job_ids),
+            )
+            return claim_token, cur.fetchall()
+
+    @staticmethod
+    def _update_jobs(
+        job_conn: Connection, job_ids: List[int], claim_token: uuid.UUID, **fields
+    ) -> int:
+        # Only jobs still claimed with claim_token are updated, a worker whose
+        # jobs were reclaimed as stale can no longer report on them.
+        assignments = sql.SQL(", ").join(
+            sql.SQL("{} = {}").format(sql.Identifier(field), sql.Placeholder(field))
+            for field in fields
+        )
+        with job_conn.cursor() as cur:
+            cur.execute(
+                sql.SQL(
+                    """
+                    UPDATE ingest_job SET {}, updated_at = NOW()
+                    WHERE id = ANY(%(job_ids)s) AND claim_token = %(claim_token)s
+                    """
+                ).format(assignments),
+                {**fields, "job_ids": job_ids, "claim_token": claim_token},
+            )
+            return cur.rowcount
+
+    @classmethod
+    def _report(
+        cls, job_conn: Connection, job_ids: List[int], claim_token: uuid.UUID, **fields
+    ):
+        # Progress reports double as the heartbeat, a worker that finds its
+        # jobs reclaimed stops instead of racing the new owner.
+        if not cls._update_jobs(job_conn, job_ids, claim_token, **fields):
+            raise RuntimeError(
+                f"Ingestion jobs {job_ids} were reclaimed by another worker"
+            )
+
+    @staticmethod
+    def _claim_check(job_ids: List[int], claim_token: uuid.UUID) -> ClaimCheck:
+        # Runs inside the ingest transaction. FOR SHARE keeps the jobs from
+        # being reclaimed (a reclaim updates claim_token) until that
+        # transaction has committed, so a new owner never clears the rows of
+        # a file before a stale worker's last write lands.
+        def check_claim(cur: Cursor) -> bool:
+            cur.execute(
+                """
+                SELECT id FROM ingest_job
+                WHERE id = ANY(%s) AND claim_token = %s
+                FOR SHARE
+                """,
+                (job_ids, claim_token),
+            )
+            return len(cur.fetchall()) == len(job_ids)
+
+        return check_claim
+
+    def _process(
+        self,
+        job_conn: Connection,
+        ingest_conn: Connection,
+        claim_token: uuid.UUID,
+        jobs: List[tuple],
+    ):
+        job_ids = [job_id for job_id, _, _, _, _ in jobs]
+        try:
+            # Drop whatever an earlier, abandoned attempt already wrote. Updates
+            # run in a single transaction and never leave partial rows.
+            retried = [
+                file_name
+                for _, file_name, _, attempts, mode in jobs
+                if attempts > 1 and mode == "add"
+            ]
+            if retried:
+                with ingest_conn.cursor() as cur:
+                    cur.execute(
+                        "DELETE FROM doc_chunks WHERE file_name = ANY(%s);", (retried,)
+                    )
+                ingest_conn.commit()
+
+            if len(jobs) == 1 and jobs[0][4] == "update":
+                self._process_update(job_conn, ingest_conn, claim_token, *jobs[0][:3])
+            elif len(jobs) == 1:
+                self._process_file(job_conn, ingest_conn, claim_token, *jobs[0][:3])
+            else:
+                self._process_batch(job_conn, ingest_conn, claim_token, jobs)
+        except Exception as e:
+            logger.exception("Ingestion jobs %s failed", job_ids)
+            self._update_jobs(
+                job_conn,
+                job_ids,
+                claim_token,
+                stage="failed",
+                error=str(e),
+                file_bytes=None,
+            )
+
+    def _process_file(
+        self,
+        job_conn: Connection,
+        ingest_conn: Connection,
+        claim_token: uuid.UUID,
+        job_id: int,
+        file_name: str,
+        file_bytes: bytes,
+    ):
+        def on_progress(**progress):
+            self._report(job_conn, [job_id], claim_token, **progress)
+
+        add_file_to_db(
+            file_name=file_name,
+            file_bytes=file_bytes,
+            connection=ingest_conn,
+            on_progress=on_progress,
+            check_claim=self._claim_check([job_id], claim_token),
+        )
+        self._update_jobs(
+            job_conn, [job_id], claim_token, stage="done", file_bytes=None
+        )
+
+    def _process_update(
+        self,
+        job_conn: Connection,
+        ingest_conn: Connection,
+        claim_token: uuid.UUID,
+        job_id: int,
+        file_name: str,
+        file_bytes: bytes,
+    ):
+        def on_progress(**progress):
+            self._report(job_conn, [job_id], claim_token, **progress)
+
+        update_file_in_db(
+            file_name=file_name,
+            file_bytes=file_bytes,
+            connection=ingest_conn,
+            on_progress=on_progress,
+            check_claim=self._claim_check([job_id], claim_token),
+        )
+        self._update_jobs(
+            job_conn, [job_id], claim_token, stage="done", file_bytes=None
+        )
+
+    def _process_batch(
+        self,
+        job_conn: Connection,
+        ingest_conn: Connection,
+        claim_token: uuid.UUID,
+        jobs: List[tuple],
+    ):
+        job_ids = {file_name: job_id for job_id, file_name, _, _, _ in jobs}
+        files = {file_name: file_bytes for _, file_name, file_bytes, _, _ in jobs}
+
+        def on_progress(**progress):
+            self._report(job_conn, list(job_ids.values()), claim_token, **progress)
+
+        for result in add_files_to_db(
+            files=files,
+            connection=ingest_conn,
+            on_progress=on_progress,
+            check_claim=self._claim_check(list(job_ids.values()), claim_token),
+        ):
+            self._update_jobs(
+                job_conn,
+                [job_ids[result.file_name]],
+                claim_token,
+                stage="failed" if result.error else "done",
+                error=result.error,
+                pages_done=result.pages_total,
+                pages_total=result.pages_total,
+                chunks_embedded=result.chunks_embedded,
+                cache_hits=result.cache_hits,
+                file_bytes=None,
+            )
+
+
+if __name__ == "__main__":
+    # Standalone ingestion worker: python job.py
+    logging.basicConfig(level=logging.INFO)
+    job_manager = JobManager()
+    job_manager.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        job_manager.stop()
@@ -1,29 +1,86 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from uuid import UUID
+from typing import Callable, List, Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-
-from schema import QueryRequest, AgentNode, Edge, Prompt
+from fastapi.concurrency import run_in_threadpool
+
+from schema import (
+    QueryRequest,
+    AgentNode,
+    Edge,
+    Prompt,
+    IndexConfig,
+    EmbeddingEncoding,
+    RetrievalBatchRequest,
+    RetrievalResult,
+)
 from utils import model_to_camel_dict
+from database import pool, async_pool
 from file import (
+    CHUNK_PAGE_SIZE,
     file_exists,
-    add_file_to_db,
     clear_file_in_db,
     delete_file_from_db,
     get_all_files_in_db,
-    get_all_chunks_of_file,
-    get_all_chunks_with_score,
+    get_chunk,
+    get_chunks_of_file,
+    get_chunks_with_score,
     get_similar_chunks,
 )
+from job import JobManager
+from index import IndexManager
+from cache import query_embedding_cache, rerank_cache, run_cache, llm_cache
+from inference import embed_batcher, rerank_batcher
+from models import MODEL_WARMUP, model_status, start_warmup, warmup_finished
+from retrieval import (
+    RETRIEVAL_BACKEND,
+    vector_mirror,
+    sync_mirror,
+    retrieve_batch,
+    check_search_params,
+)
 from graph import GraphManager
 from prompt import PromptManager
-from simulation import Validator, Executor
+from simulation import Validator, Executor, result_store
 
-app = FastAPI()
 graph_manager = GraphManager()
 prompt_manager = PromptManager()
+job_manager = JobManager()
+index_manager = IndexManager()
 
 validator = Validator(graph_manager)
 executor = Executor(graph_manager)
 
+
+def _includes_embedding(include: Optional[str]) -> bool:
+    return include is not None and "embedding" in include.split(",")
+
+
+def _with_pooled_connection(fn: Callable, **kwargs):
+    # For work handed to the threadpool, e.g. deletes, whose mirror sync and
+    # neighbour refresh rescan the corpus and must not block the event loop.
+    with pool.connection() as connection:
+        return fn(connection=connection, **kwargs)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pool.open()
+    await async_pool.open()
+    if RETRIEVAL_BACKEND == "numpy" and not vector_mirror.exists():
+        sync_mirror()
+    if MODEL_WARMUP:
+        start_warmup()
+    job_manager.start()
+    yield
+    job_manager.stop()
+    await async_pool.close()
+    pool.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -33,33 +90,103 @@ app.add_middleware(
 )
 
 
-@app.post("/file/upload", tags=["File"])
+@app.post("/file/upload", tags=["File"], status_code=202)
 async def upload_file(file: UploadFile = File(...)):
     file_name = file.filename
 
-    if file_exists(file_name):
+    if file_exists(file_name) or job_manager.job_pending(file_name):
         raise HTTPException(
             status_code=409,
             detail=f"File '{file_name}' already exists.",
         )
 
-    try:
-        file_bytes = await file.read()
-        add_file_to_db(file_name=file_name, file_bytes=file_bytes)
-        return {"message": "Upload File Successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+    file_bytes = await file.read()
+    job_id = job_manager.enqueue(file_name=file_name, file_bytes=file_bytes)
+    return {"message": "Upload File Queued", "jobId": job_id}
+
+
+@app.post("/file/upload/batch", tags=["File"], status_code=202)
+async def upload_files(files: List[UploadFile] = File(...)):
+    accepted = {}
+    response = []
+    for file in files:
+        file_name = file.filename
+        if (
+            file_name in accepted
+            or file_exists(file_name)
+            or job_manager.job_pending(file_name)
+        ):
+            response.append(
+                {
+                    "fileName": file_name,
+                    "jobId": None,
+                    "error": f"File '{file_name}' already exists.",
+                }
+            )
+            continue
+
+        accepted[file_name] = await file.read()
+        response.append({"fileName": file_name, "jobId": None, "error": None})
+
+    job_ids = job_manager.enqueue_batch(files=accepted) if accepted else {}
+    for item in response:
+        if item["error"] is None:
+            item["jobId"] = job_ids[item["fileName"]]
+
+    return {"message": "Upload Files Queued", "files": response}
+
+
+@app.get("/file/jobs/{job_id}", tags=["File"])
+async def get_file_job(job_id: int):
+    job = job_manager.get_job(job_id=job_id)
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job '{job_id}' not found.",
+        )
+    response = model_to_camel_dict(job)
+    return response
+
+
+@app.put("/file/{file_name}", tags=["File"], status_code=202)
+async def update_file(file_name: str, file: UploadFile = File(...)):
+    if not file_exists(file_name):
+        raise HTTPException(
+            status_code=404,
+            detail=f"File '{file_name}' not found.",
+        )
+
+    if job_manager.job_pending(file_name):
+        raise HTTPException(
+            status_code=409,
+            detail=f"File '{file_name}' is already being processed.",
+        )
+
+    file_bytes = await file.read()
+    job_id = job_manager.enqueue(
+        file_name=file_name, file_bytes=file_bytes, mode="update"
+    )
+    return {"message": "Update File Queued", "jobId": job_id}
 
 
 @app.delete("/file/delete", tags=["File"])
 async def clear_file():
-    clear_file_in_db()
+    await run_in_threadpool(_with_pooled_connection, clear_file_in_db)
     return {"message": "Clear Files Successfully"}
 
 
 @app.delete("/file/delete/{file_name}", tags=["File"])
 async def delete_file(file_name: str):
-    delete_file_from_db(file_name=file_name)
+    # A worker still ingesting the file would write its rows back.
+    if job_manager.job_pending(file_name):
+        raise HTTPException(
+            status_code=409,
+            detail=f"File '{file_name}' is being processed.",
+        )
+
+    await run_in_threadpool(
+        _with_pooled_connection, delete_file_from_db, file_name=file_name
+    )
     return {"message": "Delete File Successfully"}
 
 
@@ -71,17 +198,64 @@ async def list_files():
 
 
 @app.get("/file/{file_name}/chunks", tags=["File"])
-async def list_chunks(file_name: str):
-    chunks = get_all_chunks_of_file(file_name=file_name)
-    response = [model_to_camel_dict(chunk) for chunk in chunks]
-    return response
+async def list_chunks(
+    file_name: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=CHUNK_PAGE_SIZE, ge=1, le=1000),
+    include: Optional[str] = None,
+    encoding: EmbeddingEncoding = "float32",
+):
+    try:
+        page = get_chunks_of_file(
+            file_name=file_name,
+            cursor=cursor,
+            limit=limit,
+            include_embedding=_includes_embedding(include),
+            encoding=encoding,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return model_to_camel_dict(page)
 
 
 @app.post("/file/{file_name}/chunks", tags=["File"])
-async def list_chunks_with_score(file_name: str, query_request: QueryRequest):
-    chunks = get_all_chunks_with_score(file_name=file_name, query=query_request.query)
-    response = [model_to_camel_dict(chunk) for chunk in chunks]
-    return response
+async def list_chunks_with_score(
+    file_name: str,
+    query_request: QueryRequest,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=CHUNK_PAGE_SIZE, ge=1, le=1000),
+    include: Optional[str] = None,
+    encoding: EmbeddingEncoding = "float32",
+):
+    # Off the event loop, so the query embeddings and rerank pairs of
+    # concurrent requests can be micro-batched together.
+    try:
+        page = await run_in_threadpool(
+            get_chunks_with_score,
+            file_name=file_name,
+            query=query_request.query,
+            search_params=query_request.search_params,
+            cursor=cursor,
+            limit=limit,
+            include_embedding=_includes_embedding(include),
+            encoding=encoding,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return model_to_camel_dict(page)
+
+
+@app.get("/file/{file_name}/chunks/{chunk_index}", tags=["File"])
+async def read_chunk(
+    file_name: str, chunk_index: int, encoding: EmbeddingEncoding = "json"
+):
+    chunk = get_chunk(file_name=file_name, chunk_index=chunk_index, encoding=encoding)
+    if chunk is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Chunk {chunk_index} of {file_name} not found",
+        )
+    return model_to_camel_dict(chunk)
 
 
 @app.get("/file/{file_name}/chunks/{chunk_index}/similar", tags=["File"])
@@ -91,6 +265,100 @@ async def list_similar_chunks(file_name: str, chunk_index: int):
     return response
 
 
+@app.get("/index", tags=["Index"])
+async def get_vector_index():
+    index = index_manager.get_index()
+    response = model_to_camel_dict(index) if index else None
+    return response
+
+
+@app.post("/index", tags=["Index"])
+async def build_vector_index(config: IndexConfig):
+    try:
+        index = await run_in_threadpool(index_manager.build_index, config)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to build index: {str(e)}")
+    response = model_to_camel_dict(index)
+    return response
+
+
+@app.delete("/index", tags=["Index"])
+async def drop_vector_index():
+    await run_in_threadpool(index_manager.drop_index)
+    return {"message": "Drop Index Successfully"}
+
+
+@app.post("/retrieval/batch", tags=["Retrieval"])
+async def retrieve_queries(batch_request: RetrievalBatchRequest):
+    try:
+        results = await run_in_threadpool(
+            retrieve_batch,
+            queries=batch_request.queries,
+            config=batch_request.retrieval,
+            search_params=batch_request.search_params,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response = {
+        "results": [
+            model_to_camel_dict(
+                RetrievalResult(query=query, chunks=chunks, retrieval=stats)
+            )
+            for query, (chunks, stats) in zip(batch_request.queries, results)
+        ]
+    }
+    return response
+
+
+@app.get("/cache/stats", tags=["Cache"])
+async def get_cache_stats():
+    response = {
+        "queryEmbedding": model_to_camel_dict(query_embedding_cache.stats()),
+        "rerank": model_to_camel_dict(rerank_cache.stats()),
+        "run": model_to_camel_dict(run_cache.stats()),
+        "runtime": model_to_camel_dict(graph_manager.runtime_stats()),
+        "llm": model_to_camel_dict(llm_cache.stats()),
+    }
+    return response
+
+
+@app.get("/health/ready", tags=["Health"])
+async def get_readiness(response: Response):
+    # With MODEL_WARMUP the instance is ready once the background warmup has
+    # finished, without it the models load on first use and it is ready
+    # right away. warm tells whether every model is loaded.
+    models = model_status()
+    ready = not MODEL_WARMUP or warmup_finished()
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "warm": all(status.loaded for status in models.values()),
+        "models": {key: model_to_camel_dict(status) for key, status in models.items()},
+    }
+
+
+@app.get("/inference/stats", tags=["Inference"])
+async def get_inference_stats():
+    response = {
+        "embed": model_to_camel_dict(embed_batcher.stats()),
+        "rerank": model_to_camel_dict(rerank_batcher.stats()),
+    }
+    return response
+
+
+@app.delete("/cache/run", tags=["Cache"])
+async def clear_run_cache():
+    run_cache.invalidate()
+    return {"message": "Clear Run Cache Successfully"}
+
+
+@app.delete("/cache/llm", tags=["Cache"])
+async def clear_llm_cache():
+    llm_cache.invalidate()
+    return {"message": "Clear LLM Cache Successfully"}
+
+
 @app.put("/graph/entry/{node_name}", tags=["Graph"])
 async def set_graph_entry(node_name: str):
     graph_manager.set_entry(node_name=node_name)
@@ -241,18 +509,33 @@ async def validate_simulation_endpoint():
 
 @app.post("/simulation/run", tags=["Simulation"])
 async def run_simulation(query_request: QueryRequest):
-    executor.compile_graph(query=query_request.query)
-    executor.run()
-    return {"message": "Run Simulation Successfully"}
-
-
-@app.get("/simulation/result", tags=["Simulation"])
-async def get_simulation_result():
-    result = executor.get_last_result()
+    # Retrieval only happens midway through the run, a quantization it cannot
+    # search is rejected up front.
+    try:
+        check_search_params(query_request.search_params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    run = await executor.compile_graph(
+        query=query_request.query,
+        search_params=query_request.search_params,
+        retrieval_config=query_request.retrieval,
+        use_run_cache=query_request.use_run_cache,
+        bypass_llm_cache=query_request.bypass_llm_cache,
+        speculative=query_request.speculative,
+    )
+    result = await executor.run(run)
+    await result_store.set(run.run_id, result)
+    return {"message": "Run Simulation Successfully", "runId": run.run_id}
+
+
+@app.get("/simulation/result/{run_id}", tags=["Simulation"])
+async def get_simulation_result(run_id: UUID):
+    result = await result_store.get(str(run_id))
     if not result:
         raise HTTPException(
             status_code=404,
-            detail=f"No simulation result yet.",
+            detail=f"No simulation result for run {run_id}, it may have expired.",
         )
     response = model_to_camel_dict(result)
     return response
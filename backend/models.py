@@ -1,27 +1,243 @@
 import os
+import time
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
 from dotenv import load_dotenv
-from sentence_transformers import CrossEncoder
-from transformers import AutoTokenizer
-from langchain_openai import ChatOpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from schema import ModelStatus
+
+# The model libraries take seconds to import, so they are only imported by
+# the loaders below, the first time a model is actually used.
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+    from langchain_openai import ChatOpenAI
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
+# Any OpenAI-compatible chat completions endpoint.
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.longcat.chat/openai")
+LLM_MODEL = os.getenv("LLM_MODEL", "LongCat-Flash-Chat")
+
+# "torch" runs the embedding and rerank models in PyTorch eager mode, "onnx"
+# through an exported ONNX graph on ONNX Runtime.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+# Dynamic int8 quantization of the ONNX graphs for one of arm64, avx2, avx512
+# or avx512_vnni, empty for full precision.
+ONNX_QUANTIZATION = os.getenv("ONNX_QUANTIZATION", "")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_models")
+# Intra-op threads of either backend, 0 keeps the library default.
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0"))
+# Load every model in a background thread at startup instead of on first use.
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "false").lower() == "true"
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def model_id(model_name: str, backend: str, quantization: str) -> str:
+    # Identifies the outputs of a model, so caches never serve the vectors or
+    # scores of a quantized model for the full-precision one and vice versa.
+    if backend == "onnx" and quantization:
+        return f"{model_name}:int8-{quantization}"
+    return model_name
+
+
+def _model_kwargs(backend: str) -> dict:
+    if backend != "onnx":
+        if INFERENCE_THREADS:
+            import torch
+
+            torch.set_num_threads(INFERENCE_THREADS)
+        return {}
+
+    import onnxruntime
+
+    session_options = onnxruntime.SessionOptions()
+    if INFERENCE_THREADS:
+        session_options.intra_op_num_threads = INFERENCE_THREADS
+    return {
+        "backend": "onnx",
+        "model_kwargs": {
+            "provider": "CPUExecutionProvider",
+            "session_options": session_options,
+        },
+    }
+
+
+def _onnx_model_path(load, model_name: str, quantization: str, kwargs: dict) -> str:
+    # Exports the ONNX graph and its dynamically quantized variant once into
+    # ONNX_MODEL_DIR, later loads only pick the quantized file.
+    from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+
+    path = Path(ONNX_MODEL_DIR) / model_name.replace("/", "__")
+    pattern = f"model_*_{quantization}.onnx"
+    if not any(path.glob(f"onnx/{pattern}")):
+        model = load(model_name, **kwargs)
+        model.save_pretrained(str(path))
+        export_dynamic_quantized_onnx_model(model, quantization, str(path))
+
+    file_name = next(path.glob(f"onnx/{pattern}")).relative_to(path).as_posix()
+    kwargs["model_kwargs"]["file_name"] = file_name
+    return str(path)
+
+
+def load_embedding(
+    backend: str = INFERENCE_BACKEND, quantization: str = ONNX_QUANTIZATION
+) -> "HuggingFaceEmbeddings":
+    from sentence_transformers import SentenceTransformer
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    kwargs = _model_kwargs(backend)
+    model_name = EMBEDDING_MODEL
+    if backend == "onnx" and quantization:
+        model_name = _onnx_model_path(
+            SentenceTransformer, EMBEDDING_MODEL, quantization, kwargs
+        )
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=kwargs,
+        encode_kwargs={"normalize_embeddings": True},
+    )  # 384
+
+
+def load_reranking(
+    backend: str = INFERENCE_BACKEND, quantization: str = ONNX_QUANTIZATION
+) -> "CrossEncoder":
+    from sentence_transformers import CrossEncoder
+
+    kwargs = _model_kwargs(backend)
+    model_name = RERANK_MODEL
+    if backend == "onnx" and quantization:
+        model_name = _onnx_model_path(CrossEncoder, RERANK_MODEL, quantization, kwargs)
+    return CrossEncoder(model_name, **kwargs)
+
+
+def load_splitter() -> "RecursiveCharacterTextSplitter":
+    from transformers import AutoTokenizer
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+    return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        tokenizer, chunk_size=256, chunk_overlap=32
+    )
+
+
+def load_chat_model() -> "ChatOpenAI":
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        base_url=LLM_BASE_URL,
+        api_key=API_KEY,
+        model=LLM_MODEL,
+        temperature=0.7,
+        max_tokens=512,
+    )
+
+
+# Loads a model on first use, concurrent first callers wait for the same
+# load instead of each starting one.
+class LazyModel:
+    def __init__(self, name: str, load: Callable[[], Any]):
+        self.name = name
+        self._load = load
+        self._lock = threading.Lock()
+        self._model = None
+        self._load_seconds: Optional[float] = None
+        self._error: Optional[str] = None
+
+    def get(self) -> Any:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    try:
+                        model = self._load()
+                    except Exception as e:
+                        self._error = str(e)
+                        raise
+                    self._load_seconds = time.perf_counter() - start
+                    self._error = None
+                    self._model = model
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def status(self) -> ModelStatus:
+        return ModelStatus(
+            name=self.name,
+            loaded=self.loaded,
+            load_seconds=(
+                round(self._load_seconds, 3) if self._load_seconds is not None else None
+            ),
+            error=self._error,
+        )
+
+
+EMBEDDING_MODEL_ID = model_id(EMBEDDING_MODEL, INFERENCE_BACKEND, ONNX_QUANTIZATION)
+RERANK_MODEL_ID = model_id(RERANK_MODEL, INFERENCE_BACKEND, ONNX_QUANTIZATION)
+
+_models: Dict[str, LazyModel] = {
+    "embedding": LazyModel(EMBEDDING_MODEL_ID, load_embedding),
+    "reranking": LazyModel(RERANK_MODEL_ID, load_reranking),
+    "splitter": LazyModel("all-MiniLM-L6-v2 tokenizer", load_splitter),
+    "chat": LazyModel(LLM_MODEL, load_chat_model),
+}
+
+
+def get_embedding() -> "HuggingFaceEmbeddings":
+    return _models["embedding"].get()
+
+
+def get_reranking() -> "CrossEncoder":
+    return _models["reranking"].get()
+
+
+def get_splitter() -> "RecursiveCharacterTextSplitter":
+    return _models["splitter"].get()
+
+
+def get_chat_model() -> "ChatOpenAI":
+    return _models["chat"].get()
+
+
+def model_status() -> Dict[str, ModelStatus]:
+    return {key: lazy_model.status() for key, lazy_model in _models.items()}
+
+
+_warmup_done = threading.Event()
+
+
+def warmup_models():
+    # Loads every model and runs one tiny inference through the embedder and
+    # the cross-encoder, so the first request does not pay for lazy kernel
+    # and session initialisation either. A model that fails to load is
+    # reported by model_status() and retried on first use, a failure never
+    # keeps the remaining models from loading.
+    try:
+        for key, lazy_model in _models.items():
+            try:
+                lazy_model.get()
+                if key == "embedding":
+                    get_embedding().embed_query("warmup")
+                elif key == "reranking":
+                    get_reranking().predict([("warmup", "warmup")])
+            except Exception:
+                continue
+    finally:
+        _warmup_done.set()
+
+
+def warmup_finished() -> bool:
+    return _warmup_done.is_set()
+
 
-embedding = HuggingFaceEmbeddings(
-    model_name="all-MiniLM-L6-v2",
-    encode_kwargs={"normalize_embeddings": True},
-)  # 384
-reranking = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
-tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
-splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
-    tokenizer, chunk_size=256, chunk_overlap=32
-)
-model = ChatOpenAI(
-    base_url="https://api.longcat.chat/openai",
-    api_key=API_KEY,
-    model="LongCat-Flash-Chat",
-    temperature=0.7,
-    max_tokens=512,
-)
+def start_warmup() -> threading.Thread:
+    thread = threading.Thread(target=warmup_models, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
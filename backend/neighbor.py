@@ -0,0 +1,205 @@
+import os
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+from psycopg import Connection, Cursor
+
+from database import conn
+from models import EMBEDDING_DIM
+
+NEIGHBOR_K = int(os.getenv("NEIGHBOR_K", "3"))
+# "file" keeps every chunk's neighbours within its own file, "global" looks
+# across all files.
+NEIGHBOR_SCOPE = os.getenv("NEIGHBOR_SCOPE", "file")
+NEIGHBOR_BLOCK_SIZE = int(os.getenv("NEIGHBOR_BLOCK_SIZE", "1024"))
+NEIGHBOR_LOCK_KEY = 384_002
+
+# (neighbor_id, score)
+Neighbor = Tuple[int, float]
+
+
+def _load_embeddings(
+    cur: Cursor, file_name: Optional[str], scope: str
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Returns the ids, whether each chunk belongs to file_name, and the
+    # normalised embeddings of every chunk in scope.
+    if scope == "global":
+        cur.execute(
+            "SELECT id, file_name = %s, embedding FROM doc_chunks ORDER BY id",
+            (file_name,),
+        )
+    else:
+        cur.execute(
+            """
+            SELECT id, TRUE, embedding
+            FROM doc_chunks
+            WHERE file_name = %s
+            ORDER BY id
+            """,
+            (file_name,),
+        )
+    rows = cur.fetchall()
+    if not rows:
+        return (
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=bool),
+            np.empty((0, EMBEDDING_DIM), dtype=np.float32),
+        )
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    in_file = np.array([bool(row[1]) for row in rows], dtype=bool)
+    embeddings = np.vstack([row[2] for row in rows]).astype(np.float32)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    return ids, in_file, embeddings
+
+
+def _top_k(
+    query_ids: np.ndarray,
+    queries: np.ndarray,
+    candidate_ids: np.ndarray,
+    candidates: np.ndarray,
+    k: int,
+) -> Iterator[Tuple[int, List[Neighbor]]]:
+    # One matmul per block of queries keeps the score matrix bounded while
+    # still letting BLAS do all of the work.
+    for start in range(0, len(query_ids), NEIGHBOR_BLOCK_SIZE):
+        block_ids = query_ids[start : start + NEIGHBOR_BLOCK_SIZE]
+        scores = queries[start : start + NEIGHBOR_BLOCK_SIZE] @ candidates.T
+        scores[np.equal.outer(block_ids, candidate_ids)] = -np.inf
+
+        n = min(k, len(candidate_ids))
+        if n == 0:
+            for chunk_id in block_ids:
+                yield int(chunk_id), []
+            continue
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        for row, chunk_id in enumerate(block_ids):
+            order = top[row][np.argsort(-scores[row, top[row]])]
+            yield int(chunk_id), [
+                (int(candidate_ids[i]), float(scores[row, i]))
+                for i in order
+                if np.isfinite(scores[row, i])
+            ]
+
+
+def _write_neighbors(cur: Cursor, neighbors: Dict[int, List[Neighbor]]) -> None:
+    cur.execute(
+        "DELETE FROM chunk_neighbor WHERE chunk_id = ANY(%s)", (list(neighbors),)
+    )
+    with cur.copy(
+        "COPY chunk_neighbor (chunk_id, neighbor_id, rank, score) FROM STDIN"
+    ) as copy:
+        for chunk_id, chunk_neighbors in neighbors.items():
+            for rank, (neighbor_id, score) in enumerate(chunk_neighbors):
+                copy.write_row((chunk_id, neighbor_id, rank, score))
+
+
+# Top-k most similar chunks of every chunk, stored in chunk_neighbor so the
+# similar chunks of a chunk are a single indexed lookup. Rows of removed
+# chunks (on either side) are dropped by ON DELETE CASCADE.
+class NeighborGraph:
+    def __init__(self, k: int, scope: str):
+        self.k = k
+        self.scope = scope
+
+    def refresh(self, connection: Connection, file_name: Optional[str] = None):
+        with connection.cursor() as cur:
+            # Serialises refreshes, concurrent ingests would otherwise merge
+            # into the same neighbour lists.
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (NEIGHBOR_LOCK_KEY,))
+            if file_name is not None:
+                cur.execute(
+                    """
+                    DELETE FROM chunk_neighbor
+                    USING doc_chunks
+                    WHERE chunk_neighbor.chunk_id = doc_chunks.id
+                      AND doc_chunks.file_name = %s
+                    """,
+                    (file_name,),
+                )
+
+            if self.scope == "global":
+                self._refresh_global(cur, file_name)
+            elif file_name is not None:
+                ids, _, embeddings = _load_embeddings(cur, file_name, self.scope)
+                _write_neighbors(
+                    cur, dict(_top_k(ids, embeddings, ids, embeddings, self.k))
+                )
+        connection.commit()
+
+    def _refresh_global(self, cur: Cursor, file_name: Optional[str]):
+        ids, in_file, embeddings = _load_embeddings(cur, file_name, self.scope)
+        expected = min(self.k, max(len(ids) - 1, 0))
+
+        # Chunks that lost a neighbour to a deleted chunk (or never had any)
+        # are recomputed against everything.
+        cur.execute(
+            """
+            SELECT doc_chunks.id
+            FROM doc_chunks
+            LEFT JOIN chunk_neighbor ON chunk_neighbor.chunk_id = doc_chunks.id
+            GROUP BY doc_chunks.id
+            HAVING COUNT(chunk_neighbor.chunk_id) < %s
+            """,
+            (expected,),
+        )
+        stale = np.isin(ids, [row[0] for row in cur.fetchall()])
+        neighbors = dict(_top_k(ids[stale], embeddings[stale], ids, embeddings, self.k))
+
+        # Every other chunk only needs the new file's chunks merged into the
+        # neighbours it already has.
+        merge = ~stale & ~in_file
+        if in_file.any() and merge.any():
+            cur.execute(
+                """
+                SELECT chunk_id, neighbor_id, score
+                FROM chunk_neighbor
+                WHERE chunk_id = ANY(%s)
+                ORDER BY chunk_id, rank
+                """,
+                (ids[merge].tolist(),),
+            )
+            current: Dict[int, List[Neighbor]] = {}
+            for chunk_id, neighbor_id, score in cur.fetchall():
+                current.setdefault(chunk_id, []).append((neighbor_id, score))
+
+            candidates = _top_k(
+                ids[merge], embeddings[merge], ids[in_file], embeddings[in_file], self.k
+            )
+            for chunk_id, new in candidates:
+                old = current.get(chunk_id, [])
+                merged = dict(old)
+                merged.update(new)
+                best = sorted(merged.items(), key=lambda item: -item[1])[: self.k]
+                if [n for n, _ in best] != [n for n, _ in old]:
+                    neighbors[chunk_id] = best
+
+        if neighbors:
+            _write_neighbors(cur, neighbors)
+
+    def rebuild(self, connection: Connection):
+        with connection.cursor() as cur:
+            cur.execute("TRUNCATE TABLE chunk_neighbor")
+            cur.execute("SELECT DISTINCT file_name FROM doc_chunks")
+            file_names = [row[0] for row in cur.fetchall()]
+        connection.commit()
+
+        if self.scope == "global":
+            self.refresh(connection)
+        else:
+            for file_name in file_names:
+                self.refresh(connection, file_name)
+
+
+neighbor_graph = NeighborGraph(NEIGHBOR_K, NEIGHBOR_SCOPE)
+
+
+def refresh_neighbors(
+    file_name: Optional[str] = None, connection: Optional[Connection] = None
+):
+    neighbor_graph.refresh(connection or conn, file_name)
+
+
+if __name__ == "__main__":
+    # Backfills the neighbour graph, e.g. after changing NEIGHBOR_K or
+    # NEIGHBOR_SCOPE.
+    neighbor_graph.rebuild(conn)
@@ -0,0 +1,24 @@
+import os
+import pymupdf
+import pymupdf4llm
+from typing import List, Iterator
+
+# Header levels are derived from the font sizes of this many leading pages,
+# so that the first page is yielded without a pass over the whole document.
+HEADER_SAMPLE_PAGES = int(os.getenv("HEADER_SAMPLE_PAGES", "20"))
+
+
+def iter_pages(doc: pymupdf.Document) -> Iterator[str]:
+    hdr_info = pymupdf4llm.IdentifyHeaders(
+        doc, pages=list(range(min(HEADER_SAMPLE_PAGES, doc.page_count)))
+    )
+    for page_number in range(doc.page_count):
+        yield pymupdf4llm.to_markdown(
+            doc, pages=[page_number], hdr_info=hdr_info, show_progress=False
+        )
+
+
+def pdf_to_pages(file_bytes: bytes) -> List[str]:
+    # Kept free of model imports so it can run in spawned parser processes.
+    with pymupdf.open(stream=file_bytes, filetype="pdf") as doc:
+        return list(iter_pages(doc))
@@ -1,10 +1,10 @@
 import yaml
 from enum import Enum
-from typing import List
+from typing import Awaitable, Dict, List, Callable, Tuple
 from datetime import datetime
 from psycopg.types.json import Json
 
-from database import conn
+from database import conn, async_pool
 from schema import (
     PromptTemplate,
     Prompt,
@@ -105,17 +105,28 @@ class PromptManager:
             cur.execute("DELETE FROM prompt WHERE name = %s", (prompt_name,))
         conn.commit()
 
-    def get_formatted_prompt(self, prompt_name: str, query: str, context: str) -> str:
-        with conn.cursor() as cur:
-            cur.execute(
+    async def get_prompt_rows(
+        self, prompt_names: List[str]
+    ) -> Dict[str, Tuple[str, dict, bool]]:
+        async with async_pool.connection() as aconn:
+            cur = await aconn.execute(
                 """
-                SELECT template, variable_value, use_context
+                SELECT name, template, variable_value, use_context
                 FROM prompt
-                WHERE name = %s
+                WHERE name = ANY(%s)
                 """,
-                (prompt_name,),
+                (prompt_names,),
             )
-            template_name, input_variables, use_context = cur.fetchone()
+            return {name: tuple(row) for name, *row in await cur.fetchall()}
+
+    async def format_prompt(
+        self,
+        prompt_row: Tuple[str, dict, bool],
+        query: str,
+        get_context: Callable[[], Awaitable[str]],
+    ) -> str:
+        # The context is only retrieved when the prompt actually uses it.
+        template_name, input_variables, use_context = prompt_row
 
         prompt_template = (
             self.config[template_name]["context_system_prompt"] + "\n---\n"
@@ -125,7 +136,7 @@ class PromptManager:
 
         if use_context:
             prompt = prompt_template.format(
-                context=context, **input_variables, query=query
+                context=await get_context(), **input_variables, query=query
             )
         else:
             prompt = prompt_template.format(**input_variables, query=query)
@@ -0,0 +1,488 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from psycopg import Connection, sql
+from pgvector import Vector
+
+from database import conn, pool
+from schema import (
+    SearchParams,
+    RetrievalConfig,
+    RetrievedChunk,
+    RetrievalStats,
+    Quantization,
+)
+from models import EMBEDDING_DIM
+from index import (
+    VECTOR_QUANTIZATION,
+    QUANTIZED_OVERSAMPLE,
+    apply_search_params,
+    quantized_expression,
+)
+from cache import query_embedding_cache, rerank_cache
+
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "pgvector")
+VECTOR_MIRROR_DIR = os.getenv("VECTOR_MIRROR_DIR", "mirror")
+MIRROR_LOCK_KEY = 384_001
+MIRROR_BLOCK_SIZE = 65_536
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# (id, file_name, chunk_index, content, distance)
+SearchResult = Tuple[int, str, int, str, float]
+
+
+def quantize(matrix: np.ndarray, quantization: Quantization) -> Dict[str, np.ndarray]:
+    if quantization == "halfvec":
+        return {"codes": matrix.astype(np.float16)}
+    if quantization == "int8":
+        # Symmetric scalar quantization with one scale per vector.
+        scales = np.maximum(np.abs(matrix).max(axis=1), 1e-12) / 127
+        codes = np.round(matrix / scales[:, None]).astype(np.int8)
+        return {"codes": codes, "scales": scales.astype(np.float32)}
+    if quantization == "binary":
+        return {"codes": np.packbits(matrix > 0, axis=1)}
+    return {}
+
+
+# Every chunk embedding as one memory-mapped float32 matrix, shared by all
+# workers on a host through the page cache. Each sync writes a new snapshot
+# directory and then switches the CURRENT pointer, readers reload lazily.
+class VectorMirror:
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._version = None
+        self._embeddings = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        self._quantized = {}
+        self._meta = {"ids": [], "file_names": [], "chunk_indexes": [], "contents": []}
+
+    def sync(self, connection: Connection, quantization: Quantization = "none"):
+        with connection.cursor() as cur:
+            # Serialises concurrent rebuilds across processes, so the last
+            # snapshot published always reflects the latest committed rows.
+            # Everything on disk is only touched while holding it.
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIRROR_LOCK_KEY,))
+            # Versions sort by the time they were taken under the lock.
+            version = f"{time.time_ns():020d}-{uuid.uuid4().hex}"
+            snapshot = self.directory / version
+            snapshot.mkdir(parents=True)
+            cur.execute(
+                """
+                SELECT id, file_name, chunk_index, content, embedding
+                FROM doc_chunks
+                ORDER BY id
+                """
+            )
+            meta = {"ids": [], "file_names": [], "chunk_indexes": [], "contents": []}
+            embeddings = []
+            for id, file_name, chunk_index, content, chunk_embedding in cur:
+                meta["ids"].append(id)
+                meta["file_names"].append(file_name)
+                meta["chunk_indexes"].append(chunk_index)
+                meta["contents"].append(content)
+                embeddings.append(chunk_embedding)
+
+            matrix = (
+                np.vstack(embeddings).astype(np.float32)
+                if embeddings
+                else np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+            )
+            np.save(snapshot / "embeddings.npy", matrix)
+            # The quantized codes are what gets scanned, the float32 matrix
+            # is only paged in for the rows being rescored.
+            for name, array in quantize(matrix, quantization).items():
+                np.save(snapshot / f"{name}.npy", array)
+            meta["quantization"] = quantization
+            (snapshot / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+            pointer = self.directory / "CURRENT.tmp"
+            pointer.write_text(version)
+            os.replace(pointer, self.directory / "CURRENT")
+
+            # Readers that still map an old snapshot keep their open file
+            # handles, readers about to load one retry with CURRENT.
+            for path in self.directory.iterdir():
+                if path.is_dir() and path.name < version:
+                    shutil.rmtree(path, ignore_errors=True)
+        connection.commit()
+
+    def exists(self) -> bool:
+        return (self.directory / "CURRENT").exists()
+
+    def _load(self, retries: int = 3):
+        # A sync may replace the snapshot between reading CURRENT and opening
+        # its files, CURRENT then already names the newer one. If none can be
+        # opened the snapshot loaded before stays in use.
+        for _ in range(retries):
+            try:
+                version = (self.directory / "CURRENT").read_text().strip()
+            except FileNotFoundError:
+                return
+
+            with self._lock:
+                if version == self._version:
+                    return
+                snapshot = self.directory / version
+                try:
+                    embeddings = np.load(snapshot / "embeddings.npy", mmap_mode="r")
+                    meta = json.loads((snapshot / "meta.json").read_text("utf-8"))
+                    quantized = {
+                        path.stem: np.load(path, mmap_mode="r")
+                        for path in snapshot.glob("*.npy")
+                        if path.stem in ("codes", "scales")
+                    }
+                except FileNotFoundError:
+                    continue
+                self._embeddings, self._meta, self._quantized = (
+                    embeddings,
+                    meta,
+                    quantized,
+                )
+                self._version = version
+                return
+
+    @staticmethod
+    def _check_quantization(meta: dict, quantization: Quantization):
+        # Only the quantization of the snapshot can be searched, next to the
+        # full-precision vectors every snapshot has.
+        mirrored = meta.get("quantization", "none")
+        if quantization not in ("none", mirrored):
+            raise ValueError(
+                f"The vector mirror holds {mirrored} codes, "
+                f"{quantization} quantization cannot be searched"
+            )
+
+    def check_quantization(self, quantization: Quantization):
+        self._load()
+        with self._lock:
+            meta = self._meta
+        self._check_quantization(meta, quantization)
+
+    def search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        quantization: Quantization = "none",
+        oversample: int = QUANTIZED_OVERSAMPLE,
+    ) -> List[SearchResult]:
+        self._load()
+        with self._lock:
+            embeddings, quantized, meta = self._embeddings, self._quantized, self._meta
+
+        k = min(k, len(embeddings))
+        if k == 0:
+            return []
+
+        self._check_quantization(meta, quantization)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if quantization != "none":
+            # Shortlist on the quantized codes, then rescore the oversampled
+            # candidates with the full-precision vectors.
+            n = min(k * oversample, len(embeddings))
+            coarse = self._coarse_scores(quantized, query, quantization)
+            candidates = np.sort(np.argpartition(-coarse, n - 1)[:n])
+            scores = embeddings[candidates] @ query
+        else:
+            candidates = None
+            # Embeddings are normalised, so the dot product is the cosine
+            # similarity.
+            scores = embeddings @ query
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = top if candidates is None else candidates[top]
+
+        return [
+            (
+                meta["ids"][i],
+                meta["file_names"][i],
+                meta["chunk_indexes"][i],
+                meta["contents"][i],
+                float(1 - score),
+            )
+            for i, score in zip(rows, scores[top])
+        ]
+
+    @staticmethod
+    def _coarse_scores(
+        quantized: Dict[str, np.ndarray], query: np.ndarray, quantization: Quantization
+    ) -> np.ndarray:
+        codes = quantized["codes"]
+        if quantization == "binary":
+            # Negated Hamming distance, so that higher is more similar.
+            bits = np.packbits(query > 0)
+            return -_POPCOUNT[codes ^ bits].sum(axis=1, dtype=np.int32)
+
+        # numpy has no BLAS path for float16 / int8, so blocks are widened to
+        # float32 on the fly instead of keeping a float32 copy around.
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), MIRROR_BLOCK_SIZE):
+            block = codes[start : start + MIRROR_BLOCK_SIZE].astype(np.float32)
+            scores[start : start + MIRROR_BLOCK_SIZE] = block @ query
+        if quantization == "int8":
+            scores *= quantized["scales"]
+        return scores
+
+
+vector_mirror = VectorMirror(VECTOR_MIRROR_DIR)
+
+
+def sync_mirror(connection: Optional[Connection] = None):
+    if RETRIEVAL_BACKEND == "numpy":
+        vector_mirror.sync(connection or conn, VECTOR_QUANTIZATION)
+
+
+def check_search_params(
+    search_params: Optional[SearchParams], backend: str = RETRIEVAL_BACKEND
+):
+    # Raises ValueError for a quantization the backend cannot search, so that
+    # a request fails before any of its work is done.
+    quantization = (
+        search_params.quantization if search_params else None
+    ) or VECTOR_QUANTIZATION
+    if backend == "numpy":
+        vector_mirror.check_quantization(quantization)
+    else:
+        quantized_expression(quantization)
+
+
+def search_chunks(
+    query_embedding: List[float],
+    k: int,
+    search_params: Optional[SearchParams] = None,
+    backend: str = RETRIEVAL_BACKEND,
+) -> List[SearchResult]:
+    search_params = search_params or SearchParams()
+    quantization = search_params.quantization or VECTOR_QUANTIZATION
+    oversample = search_params.oversample or QUANTIZED_OVERSAMPLE
+    if backend == "numpy":
+        return vector_mirror.search(query_embedding, k, quantization, oversample)
+
+    expression, _, operator, query = quantized_expression(quantization)
+    if quantization == "none":
+        statement = sql.SQL(
+            """
+            SELECT id, file_name, chunk_index, content, embedding <=> %(query)s AS distance
+            FROM doc_chunks
+            ORDER BY distance
+            LIMIT %(k)s;
+            """
+        )
+    else:
+        # The index scan only sees the quantized expression, the outer query
+        # rescores its oversampled candidates with the full-precision vector.
+        statement = sql.SQL(
+            """
+            SELECT id, file_name, chunk_index, content, embedding <=> %(query)s AS distance
+            FROM (
+                SELECT *
+                FROM doc_chunks
+                ORDER BY {expression} {operator} {query}
+                LIMIT %(candidates)s
+            ) AS candidates
+            ORDER BY distance
+            LIMIT %(k)s;
+            """
+        ).format(expression=expression, operator=operator, query=query)
+
+    with pool.connection() as connection, connection.cursor() as cur:
+        apply_search_params(cur, search_params)
+        cur.execute(
+            statement,
+            {"query": Vector(query_embedding), "k": k, "candidates": k * oversample},
+        )
+        return cur.fetchall()
+
+
+def search_chunks_batch(
+    query_embeddings: List[List[float]],
+    k: int,
+    search_params: Optional[SearchParams] = None,
+    backend: str = RETRIEVAL_BACKEND,
+) -> List[List[SearchResult]]:
+    if backend == "numpy" or len(query_embeddings) == 1:
+        return [
+            search_chunks(query_embedding, k, search_params, backend)
+            for query_embedding in query_embeddings
+        ]
+
+    search_params = search_params or SearchParams()
+    quantization = search_params.quantization or VECTOR_QUANTIZATION
+    oversample = search_params.oversample or QUANTIZED_OVERSAMPLE
+    expression, _, operator, query = quantized_expression(
+        quantization, sql.SQL("queries.embedding")
+    )
+    limit = sql.SQL("%(k)s" if quantization == "none" else "%(candidates)s")
+
+    # All queries go through one statement: a LATERAL top-k per unnested
+    # query vector, each of which can still use the ANN index.
+    statement = sql.SQL(
+        """
+        SELECT queries.ord, candidates.id, candidates.file_name,
+               candidates.chunk_index, candidates.content, candidates.distance
+        FROM unnest(%(queries)s::vector[]) WITH ORDINALITY AS queries(embedding, ord)
+        CROSS JOIN LATERAL (
+            SELECT id, file_name, chunk_index, content,
+                   doc_chunks.embedding <=> queries.embedding AS distance
+            FROM doc_chunks
+            ORDER BY {expression} {operator} {query}
+            LIMIT {limit}
+        ) AS candidates
+        ORDER BY queries.ord, candidates.distance
+        """
+    ).format(expression=expression, operator=operator, query=query, limit=limit)
+
+    results = [[] for _ in query_embeddings]
+    with pool.connection() as connection, connection.cursor() as cur:
+        apply_search_params(cur, search_params)
+        cur.execute(
+            statement,
+            {
+                "queries": [Vector(e) for e in query_embeddings],
+                "k": k,
+                "candidates": k * oversample,
+            },
+        )
+        for ord, *result in cur.fetchall():
+            if len(results[ord - 1]) < k:
+                results[ord - 1].append(tuple(result))
+    return results
+
+
+class RerankCostTracker:
+    # Moving average of the cross-encoder cost per pair, used to estimate how
+    # much time was saved when pairs were skipped or served from the cache.
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._ms_per_pair = None
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ms: float, pairs: int):
+        ms_per_pair = elapsed_ms / pairs
+        with self._lock:
+            if self._ms_per_pair is None:
+                self._ms_per_pair = ms_per_pair
+            else:
+                self._ms_per_pair += self.alpha * (ms_per_pair - self._ms_per_pair)
+
+    def estimate(self, pairs: int) -> float:
+        with self._lock:
+            return (self._ms_per_pair or 0.0) * pairs
+
+
+rerank_cost = RerankCostTracker()
+
+
+def _shortlist(
+    results: List[SearchResult], config: RetrievalConfig
+) -> List[SearchResult]:
+    final_k = min(config.final_k, len(results))
+    if not config.rerank or final_k == 0:
+        return []
+    if not config.cascade or len(results) == final_k:
+        return results
+
+    distances = [distance for *_, distance in results]
+    if distances[final_k] - distances[final_k - 1] >= config.cascade_gap:
+        # The bi-encoder already puts a clear margin after the top final_k.
+        return []
+
+    cutoff = distances[final_k - 1] + config.cascade_gap
+    return [result for result in results if result[4] <= cutoff]
+
+
+def retrieve(
+    query: str,
+    config: Optional[RetrievalConfig] = None,
+    search_params: Optional[SearchParams] = None,
+) -> Tuple[List[RetrievedChunk], RetrievalStats]:
+    return retrieve_batch([query], config, search_params)[0]
+
+
+def retrieve_batch(
+    queries: List[str],
+    config: Optional[RetrievalConfig] = None,
+    search_params: Optional[SearchParams] = None,
+) -> List[Tuple[List[RetrievedChunk], RetrievalStats]]:
+    # One embedding call, one candidate query and one cross-encoder batch for
+    # all queries, however many there are.
+    config = config or RetrievalConfig()
+    query_embeddings = query_embedding_cache.embed_queries(queries)
+    results = search_chunks_batch(
+        query_embeddings, k=config.candidate_k, search_params=search_params
+    )
+    shortlists = [_shortlist(query_results, config) for query_results in results]
+
+    start = time.perf_counter()
+    requests = [
+        (
+            query,
+            [(id, file_name, content) for id, file_name, _, content, _ in shortlist],
+        )
+        for query, shortlist in zip(queries, shortlists)
+        if shortlist
+    ]
+    scores, reranked = rerank_cache.predict_batch(requests) if requests else ([], [])
+    rerank_ms = (time.perf_counter() - start) * 1000
+
+    total_reranked = sum(reranked)
+    if total_reranked:
+        rerank_cost.record(rerank_ms, total_reranked)
+    total_pairs = sum(len(shortlist) for shortlist in shortlists)
+
+    scores, reranked = iter(scores), iter(reranked)
+    retrieved = []
+    for query_results, shortlist in zip(results, shortlists):
+        if shortlist:
+            query_scores, query_reranked = next(scores), next(reranked)
+            ranked = sorted(
+                zip(shortlist, query_scores), key=lambda x: x[1], reverse=True
+            )
+        else:
+            query_reranked = 0
+            ranked = [(result, 1 - result[4]) for result in query_results]
+
+        chunks = [
+            RetrievedChunk(
+                file_name=file_name,
+                chunk_index=chunk_index,
+                content=content,
+                distance=distance,
+                score=score,
+                reranked=bool(shortlist),
+            )
+            for (_, file_name, chunk_index, content, distance), score in ranked[
+                : config.final_k
+            ]
+        ]
+        # The rerank batch is shared, its time is split by pairs per query.
+        query_rerank_ms = (
+            rerank_ms * len(shortlist) / total_pairs if total_pairs else 0.0
+        )
+        stats = RetrievalStats(
+            candidate_k=config.candidate_k,
+            final_k=config.final_k,
+            candidates=len(query_results),
+            reranked=query_reranked,
+            rerank_cached=len(shortlist) - query_reranked,
+            rerank_skipped=not shortlist,
+            rerank_ms=round(query_rerank_ms, 2),
+            rerank_saved_ms=round(
+                rerank_cost.estimate(len(query_results) - query_reranked), 2
+            ),
+        )
+        retrieved.append((chunks, stats))
+    return retrieved
+
+
+def format_context(chunks: List[RetrievedChunk]) -> str:
+    return "".join(
+        f"[Source: {chunk.file_name}]\n{chunk.content}\n\n" for chunk in chunks
+    )
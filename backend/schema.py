@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from pydantic.alias_generators import to_camel
 from typing import List, Optional, Dict, Literal, Union
 
@@ -12,15 +12,147 @@ class File(CaseModel):
     created_at: str
 
 
+EmbeddingEncoding = Literal["json", "float32", "float16"]
+
+
 class Chunk(CaseModel):
     index: int
     content: str
-    embedding: List[float]
+    # A list of floats, or a base64 string of little-endian floats when the
+    # embedding was requested with a binary encoding.
+    embedding: Optional[Union[List[float], str]] = None
     score: Optional[float] = None
+    file_name: Optional[str] = None
+
+
+class ChunkPage(CaseModel):
+    chunks: List[Chunk]
+    total: int
+    next_cursor: Optional[str] = None
+    embedding_encoding: Optional[EmbeddingEncoding] = None
+
+
+class IngestJob(CaseModel):
+    id: int
+    file_name: str
+    mode: Literal["add", "update"]
+    stage: Literal["queued", "parsing", "embedding", "done", "failed"]
+    pages_done: int
+    pages_total: Optional[int] = None
+    chunks_embedded: int
+    cache_hits: int
+    chunks_reused: int
+    chunks_removed: int
+    cache_hit_rate: float
+    error: Optional[str] = None
+
+
+class FileIngestResult(CaseModel):
+    file_name: str
+    pages_total: int = 0
+    chunks_embedded: int = 0
+    cache_hits: int = 0
+    error: Optional[str] = None
+
+
+Quantization = Literal["none", "halfvec", "int8", "binary"]
+
+
+class SearchParams(CaseModel):
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    probes: Optional[int] = Field(default=None, ge=1)
+    quantization: Optional[Quantization] = None
+    oversample: Optional[int] = Field(default=None, ge=1, le=100)
+
+
+class CacheStats(CaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+
+class ModelStatus(CaseModel):
+    name: str
+    loaded: bool
+    load_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatcherStats(CaseModel):
+    queue_depth: int
+    max_queue_depth: int
+    batches: int
+    calls: int
+    inputs: int
+    mean_batch_size: float
+    max_batch_size: int
+
+
+class RunCacheStats(CaseModel):
+    size: int
+    hits: int
+    misses: int
+    hit_rate: float
+    saved_ms: float
+
+
+class LLMCacheStats(CaseModel):
+    size: int
+    memory_hits: int
+    persistent_hits: int
+    misses: int
+    hit_rate: float
+
+
+class RuntimeCacheStats(CaseModel):
+    hits: int
+    compiles: int
+    hit_rate: float
+    mean_hit_ms: float
+    mean_compile_ms: float
+
+
+class RetrievalConfig(CaseModel):
+    candidate_k: int = Field(default=10, ge=1, le=200)
+    final_k: int = Field(default=3, ge=1, le=50)
+    rerank: bool = True
+    # Skip or shorten reranking when the bi-encoder distances already
+    # separate the top final_k candidates by at least cascade_gap.
+    cascade: bool = False
+    cascade_gap: float = Field(default=0.05, ge=0)
 
 
 class QueryRequest(CaseModel):
     query: str
+    search_params: Optional[SearchParams] = None
+    retrieval: Optional[RetrievalConfig] = None
+    # Overrides RUN_CACHE_ENABLED for this run
+    use_run_cache: Optional[bool] = None
+    # Skips the LLM response cache of the decision agents for this run
+    bypass_llm_cache: bool = False
+    # Overrides SPECULATIVE_DECISIONS for this run
+    speculative: Optional[bool] = None
+
+
+class IndexConfig(CaseModel):
+    method: Literal["hnsw", "ivfflat"]
+    m: int = Field(default=16, ge=2, le=100)
+    ef_construction: int = Field(default=64, ge=4, le=1000)
+    lists: int = Field(default=100, ge=1)
+    # int8 has no pgvector type, it is only available on the numpy mirror
+    quantization: Optional[Literal["none", "halfvec", "binary"]] = None
+    maintenance_work_mem: Optional[str] = None
+
+
+class VectorIndex(CaseModel):
+    name: str
+    method: str
+    options: Dict[str, str]
+    size_bytes: int
+    definition: str
+    quantization: Quantization = "none"
 
 
 class ClassificationConfig(CaseModel):
@@ -49,6 +181,7 @@ class AgentNode(CaseModel):
     ] = None
 
     prompt_name: Optional[str] = None
+    retrieval_config: Optional[RetrievalConfig] = None
 
 
 class Condition(CaseModel):
@@ -147,6 +280,8 @@ class RouteTrace(CaseModel):
     reason: str
     next_node: str
     matched_condition: str
+    # The decision was served from the LLM response cache
+    cached: bool = False
 
 
 class RetrievedChunk(CaseModel):
@@ -155,11 +290,49 @@ class RetrievedChunk(CaseModel):
     content: str
     distance: float
     score: float
+    reranked: bool = True
+
+
+class RetrievalBatchRequest(CaseModel):
+    queries: List[str] = Field(min_length=1, max_length=1000)
+    search_params: Optional[SearchParams] = None
+    retrieval: Optional[RetrievalConfig] = None
+
+
+class RetrievalStats(CaseModel):
+    candidate_k: int
+    final_k: int
+    candidates: int
+    reranked: int
+    rerank_cached: int
+    rerank_skipped: bool
+    rerank_ms: float
+    rerank_saved_ms: float
+
+
+class RetrievalResult(CaseModel):
+    query: str
+    chunks: List[RetrievedChunk]
+    retrieval: RetrievalStats
+
+
+class SpeculationStats(CaseModel):
+    launched: int
+    # Decisions the run actually consumed
+    used: int
+    # Unused decisions cancelled before their call finished, i.e. calls saved;
+    # the rest of the unused ones were wasted calls
+    cancelled: int = 0
 
 
 class Result(CaseModel):
+    run_id: Optional[str] = None
     query: str
     chunks: List[RetrievedChunk]
     context: str
+    retrieval: Optional[RetrievalStats] = None
+    retrieval_skipped: bool = False
+    speculation: Optional[SpeculationStats] = None
     traces: List[Union[RespondTrace, RouteTrace]]
     graph: Graph
+    cached: bool = False
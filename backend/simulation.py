@@ -1,5 +1,9 @@
-from typing import List
-from pgvector import Vector
+import os
+import time
+import uuid
+import asyncio
+from typing import List, Optional
+from psycopg.types.json import Json
 
 from schema import (
     Requirement,
@@ -8,13 +12,25 @@ from schema import (
     Validation,
     RespondTrace,
     RouteTrace,
-    RetrievedChunk,
     Result,
+    SpeculationStats,
+    SearchParams,
+    RetrievalConfig,
 )
-from database import conn
+from database import async_pool
 from file import get_chunk_count
+from retrieval import retrieve, format_context
+from cache import LLM_CACHE_ENABLED, RUN_CACHE_ENABLED, run_cache
 from graph import GraphManager, State
-from models import embedding, reranking
+
+# Results of finished runs are kept this many seconds, and at most this many
+# of them, the oldest are dropped first.
+SIMULATION_RESULT_TTL = float(os.getenv("SIMULATION_RESULT_TTL", "3600"))
+SIMULATION_RESULT_MAX = int(os.getenv("SIMULATION_RESULT_MAX", "1000"))
+# Start the decision agents a run may reach concurrently at run start, at most
+# SPECULATIVE_MAX_AGENTS of them (0 for all).
+SPECULATIVE_DECISIONS = os.getenv("SPECULATIVE_DECISIONS", "false").lower() == "true"
+SPECULATIVE_MAX_AGENTS = int(os.getenv("SPECULATIVE_MAX_AGENTS", "0"))
 
 
 class Validator:
@@ -173,20 +189,121 @@ class Validator:
         return missing_routes
 
 
+class RunContext:
+    # Everything a single run reads and writes. Each /simulation/run gets its
+    # own, so concurrent runs never see each other's chunks or results.
+    def __init__(
+        self,
+        query: str,
+        search_params: Optional[SearchParams] = None,
+        retrieval_config: Optional[RetrievalConfig] = None,
+        use_run_cache: Optional[bool] = None,
+        bypass_llm_cache: bool = False,
+        speculative: Optional[bool] = None,
+    ):
+        self.run_id = str(uuid.uuid4())
+        self.query = query
+        self.search_params = search_params
+        self.retrieval_config = retrieval_config or RetrievalConfig()
+        self.use_run_cache = (
+            RUN_CACHE_ENABLED if use_run_cache is None else use_run_cache
+        )
+        self.use_llm_cache = LLM_CACHE_ENABLED and not bypass_llm_cache
+        self.speculative = SPECULATIVE_DECISIONS if speculative is None else speculative
+        self.graph = None
+        self.runtime = None
+        self.chunks = []
+        self.retrieval_stats = None
+        self.retrievals = {}
+
+    def options(self) -> dict:
+        return {
+            "search_params": (
+                self.search_params.model_dump() if self.search_params else None
+            ),
+            "retrieval": self.retrieval_config.model_dump(),
+        }
+
+    async def retrieve_context(
+        self, retrieval_config: Optional[RetrievalConfig] = None
+    ) -> str:
+        # Called by the first responder whose prompt uses the context and
+        # memoised per retrieval config for the rest of the run. The result
+        # reports the chunks of the last responder that asked for context.
+        retrieval_config = retrieval_config or self.retrieval_config
+        key = retrieval_config.model_dump_json()
+        if key not in self.retrievals:
+            chunks, stats = await asyncio.to_thread(
+                retrieve,
+                query=self.query,
+                config=retrieval_config,
+                search_params=self.search_params,
+            )
+            self.retrievals[key] = (chunks, stats, format_context(chunks))
+
+        self.chunks, self.retrieval_stats, context = self.retrievals[key]
+        return context
+
+
 class Executor:
     def __init__(self, graph_manager: GraphManager):
         self.graph_manager = graph_manager
-        self.runtime = None
-        self.query = ""
-        self.chunks = []
-        self.context = ""
-        self.last_result = None
 
-    def get_last_result(self):
-        return self.last_result
+    async def compile_graph(
+        self,
+        query: str,
+        search_params: Optional[SearchParams] = None,
+        retrieval_config: Optional[RetrievalConfig] = None,
+        use_run_cache: Optional[bool] = None,
+        bypass_llm_cache: bool = False,
+        speculative: Optional[bool] = None,
+    ) -> RunContext:
+        run = RunContext(
+            query,
+            search_params,
+            retrieval_config,
+            use_run_cache,
+            bypass_llm_cache,
+            speculative,
+        )
+        run.graph, run.runtime = await self.graph_manager.get_runtime()
+        return run
+
+    async def run(self, run: RunContext) -> Result:
+        # The LLM calls and database reads of the agents are awaited, while
+        # retrieval and the run cache run in worker threads, so concurrent
+        # runs interleave on the event loop instead of blocking it.
+        if run.use_run_cache:
+            cached = await asyncio.to_thread(run_cache.get, run.query, run.options())
+            if cached is not None:
+                return cached.model_copy(update={"run_id": run.run_id})
+
+        start = time.perf_counter()
+        speculations = (
+            self.graph_manager.speculate(
+                run.graph, run.query, run.use_llm_cache, SPECULATIVE_MAX_AGENTS
+            )
+            if run.speculative
+            else {}
+        )
+        try:
+            final_state = await run.runtime.ainvoke(
+                State(query=run.query, context=""),
+                config={
+                    "configurable": {
+                        "retrieve_context": run.retrieve_context,
+                        "use_llm_cache": run.use_llm_cache,
+                        "speculations": speculations,
+                    }
+                },
+            )
+        finally:
+            # The routers cancel the branches not taken as they go, this only
+            # catches what is left when the run ends or fails.
+            for task in speculations.values():
+                task.cancel()
+            await asyncio.gather(*speculations.values(), return_exceptions=True)
 
-    def run(self):
-        final_state = self.runtime.invoke(State(query=self.query, context=self.context))
         traces = []
         for trace in final_state["traces"]:
             if trace["agent_type"] == "responder":
@@ -208,56 +325,83 @@ class Executor:
                         reason=trace["reason"],
                         next_node=trace.get("next_node", "__end__"),
                         matched_condition=trace.get("matched_condition", "N/A"),
+                        cached=trace["cached"],
                     )
                 )
 
-        self.last_result = Result(
+        result = Result(
+            run_id=run.run_id,
             query=final_state["query"],
-            chunks=self.chunks,
+            chunks=run.chunks,
             context=final_state["context"],
+            retrieval=run.retrieval_stats,
+            retrieval_skipped=not run.retrievals,
+            speculation=(
+                SpeculationStats(
+                    launched=len(speculations),
+                    used=sum(trace.agent in speculations for trace in traces),
+                    cancelled=sum(task.cancelled() for task in speculations.values()),
+                )
+                if speculations
+                else None
+            ),
             traces=traces,
-            graph=self.graph_manager.get_graph(),
+            graph=run.graph,
         )
+        if run.use_run_cache:
+            await asyncio.to_thread(
+                run_cache.set,
+                run.query,
+                run.options(),
+                result,
+                latency_ms=(time.perf_counter() - start) * 1000,
+            )
+        return result
 
-    def compile_graph(self, query: str):
-        self.query = query
-        self.chunks.clear()
-        self.context = self._retrieve_context(query=query)
-        self.runtime = self.graph_manager.compile_graph()
 
-    def _retrieve_context(self, query: str) -> str:
-        queryEmbed = embedding.embed_query(query)
-        queryVector = Vector(queryEmbed)
+# Results of finished runs by run id. They live in Postgres rather than in
+# the process, so any worker behind the load balancer can serve them.
+class ResultStore:
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
 
-        with conn.cursor() as cur:
-            cur.execute(
+    async def set(self, run_id: str, result: Result):
+        async with async_pool.connection() as aconn:
+            await aconn.execute(
                 """
-                SELECT file_name, chunk_index, content, embedding <=> %s AS distance
-                FROM doc_chunks
-                ORDER BY distance
-                LIMIT 10;
+                INSERT INTO simulation_result (run_id, result)
+                VALUES (%s, %s)
                 """,
-                (queryVector,),
+                (run_id, Json(result.model_dump(mode="json"))),
             )
-            results = cur.fetchall()
-
-        pairs = [(query, r[2]) for r in results]
-        scores = reranking.predict(pairs)
-
-        # ((file_name, chunk_index, content, distance), score)
-        rankedRes = sorted(zip(results, scores), key=lambda x: x[1], reverse=True)
-
-        context = ""
-        for (file_name, chunk_index, content, distance), score in rankedRes[:3]:
-            context += f"[Source: {file_name}]\n{content}\n\n"
-            self.chunks.append(
-                RetrievedChunk(
-                    file_name=file_name,
-                    chunk_index=chunk_index,
-                    content=content,
-                    distance=distance,
-                    score=score,
-                )
+            await aconn.execute(
+                """
+                DELETE FROM simulation_result
+                WHERE created_at <= NOW() - make_interval(secs => %s)
+                   OR run_id IN (
+                       SELECT run_id
+                       FROM simulation_result
+                       ORDER BY created_at DESC
+                       OFFSET %s
+                   )
+                """,
+                (self.ttl, self.maxsize),
             )
 
-        return context
+    async def get(self, run_id: str) -> Optional[Result]:
+        async with async_pool.connection() as aconn:
+            cur = await aconn.execute(
+                """
+                SELECT result
+                FROM simulation_result
+                WHERE run_id = %s
+                  AND created_at > NOW() - make_interval(secs => %s)
+                """,
+                (run_id, self.ttl),
+            )
+            row = await cur.fetchone()
+        return Result.model_validate(row[0]) if row else None
+
+
+result_store = ResultStore(SIMULATION_RESULT_TTL, SIMULATION_RESULT_MAX)
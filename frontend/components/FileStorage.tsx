@@ -1,7 +1,7 @@
 import "./styles/FileStorage.css";
 import { useEffect, useState } from "react";
 import api from "../utils/api";
-import type { Chunk, ChunkFile } from "../types/file";
+import type { Chunk, ChunkFile, ChunkPage } from "../types/file";
 import { SquareSplitVertical } from "lucide-react";
 import UploadFileModal from "./modals/UploadFileModal";
 import ChunkDetailModal from "./modals/ChunkDetailModal";
@@ -32,6 +32,9 @@ export function FileStorage() {
     const [selectedDeleteFile, setSelectedDeleteFile] = useState<string>("");
     const [queryValue, setQueryValue] = useState<string>("");
     const [chunks, setChunks] = useState<Chunk[]>([]);
+    const [totalChunks, setTotalChunks] = useState<number>(0);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [rankedQuery, setRankedQuery] = useState<string>("");
     const [selectedChunk, setSelectedChunk] = useState<Chunk>();
     const [similarChunks, setSimilarChunks] = useState<Chunk[]>([]);
 
@@ -49,20 +52,38 @@ export function FileStorage() {
         setFileList(data);
     };
 
+    const setChunkPage = (page: ChunkPage, append: boolean) => {
+        setChunks(append ? [...chunks, ...page.chunks] : page.chunks);
+        setTotalChunks(page.total);
+        setNextCursor(page.nextCursor);
+    };
+
     const loadChunks = async (fileName: string) => {
-        const data = await api.file.getChunks(fileName);
-        setChunks(data);
+        const page = await api.file.getChunks(fileName);
+        setRankedQuery("");
+        setChunkPage(page, false);
     };
 
     const handleRank = async () => {
-        const data = await api.file.getScoredChunks(selectedViewFile, queryValue);
-        setChunks(data);
+        const page = await api.file.getScoredChunks(selectedViewFile, queryValue);
+        setRankedQuery(queryValue);
+        setChunkPage(page, false);
+    };
+
+    const handleLoadMore = async () => {
+        const page = rankedQuery
+            ? await api.file.getScoredChunks(selectedViewFile, rankedQuery, nextCursor)
+            : await api.file.getChunks(selectedViewFile, nextCursor);
+        setChunkPage(page, true);
     };
 
-    const handleShowChunkDetail = async (index: number) => {
-        const data = await api.file.getSimilarChunks(selectedViewFile, index);
-        setSimilarChunks(data);
-        setSelectedChunk(chunks.at(index));
+    const handleShowChunkDetail = async (chunk: Chunk) => {
+        const [detail, similar] = await Promise.all([
+            api.file.getChunk(selectedViewFile, chunk.index),
+            api.file.getSimilarChunks(selectedViewFile, chunk.index),
+        ]);
+        setSimilarChunks(similar);
+        setSelectedChunk({ ...chunk, embedding: detail.embedding });
         setShowChunkDetail(true);
     };
 
@@ -81,6 +102,8 @@ export function FileStorage() {
         setSelectedDeleteFile("");
         setQueryValue("");
         setChunks([]);
+        setTotalChunks(0);
+        setNextCursor(null);
         loadFileList();
         onCloseClear();
     };
@@ -96,6 +119,8 @@ export function FileStorage() {
         if (selectedViewFile == selectedDeleteFile) {
             setSelectedViewFile("");
             setChunks([]);
+            setTotalChunks(0);
+            setNextCursor(null);
         }
         loadFileList();
         onCloseDelete();
@@ -153,8 +178,8 @@ export function FileStorage() {
         return (
             <div className="chunk-row-container">
                 {
-                    chunks.map((chunk: Chunk, index: number) => (
-                        <div key={chunk.index + 1} className="chunk-row" onClick={() => handleShowChunkDetail(index)}>
+                    chunks.map((chunk: Chunk) => (
+                        <div key={chunk.index + 1} className="chunk-row" onClick={() => handleShowChunkDetail(chunk)}>
                             <div className="chunk-content">
                                 <SquareSplitVertical size={50} />
                                 <div className="chunk-info">
@@ -169,6 +194,7 @@ export function FileStorage() {
                         </div>
                     ))
                 }
+                {nextCursor && <button onClick={() => handleLoadMore()}>Load More</button>}
             </div>
         );
     };
@@ -198,7 +224,7 @@ export function FileStorage() {
                         </div>
                     }
                     {selectedViewFile &&
-                        <h4>Total Chunks: {chunks.length}</h4>
+                        <h4>Total Chunks: {totalChunks}</h4>
                     }
                 </header>
                 {renderChunks()}
@@ -207,7 +233,7 @@ export function FileStorage() {
             {showUploadFile && <UploadFileModal key={showUploadFile ? "open" : "close"} onCloseUpload={onCloseUpload} onUploadSuccess={loadFileList} />}
             {showClearFile && <WarningModal key={showClearFile ? "open" : "close"} action="delete all files" label="Clear" onClose={onCloseClear} handler={handleClear} />}
             {showDeleteFile && <WarningModal key={showDeleteFile ? "open" : "close"} action="delete" target={selectedDeleteFile} label="Delete" onClose={onCloseDelete} handler={handleDelete} />}
-            {showChunkDetail && selectedChunk && <ChunkDetailModal key={showChunkDetail ? "open" : "close"} chunk={selectedChunk} similarChunks={similarChunks} onCloseChunkDetail={onCloseChunkDetail} />}
+            {showChunkDetail && selectedChunk && <ChunkDetailModal key={showChunkDetail ? "open" : "close"} chunk={selectedChunk} fileName={selectedViewFile} similarChunks={similarChunks} onCloseChunkDetail={onCloseChunkDetail} />}
         </main>
     );
 }
@@ -163,6 +163,10 @@ export default function ResultVisual({ waitResult, onResultReady }: { waitResult
     };
 
     const renderRAGDetail = () => {
+        if (result.retrievalSkipped) {
+            return <span className="list-empty">No agent on this route needed RAG context, retrieval was skipped</span>;
+        }
+
         return (
             <div className="rag-detail-container">
                 {result.chunks.map((chunk: RetrievedChunk, index: number) => (
@@ -237,7 +241,7 @@ export default function ResultVisual({ waitResult, onResultReady }: { waitResult
                             <span>{String(selectedTrace.outputValue)}</span>
                         </div>
                         <div className="trace-detail-item block">
-                            <h4>Reason:</h4>
+                            <h4>Reason{selectedTrace.cached && " (cached)"}:</h4>
                             <span>{selectedTrace.reason}</span>
                         </div>
                         <div className="trace-detail-item inline">
@@ -258,7 +262,7 @@ export default function ResultVisual({ waitResult, onResultReady }: { waitResult
     return (
         <main className="result-visual-container">
             <section className="trace-container">
-                <h3>Traces</h3>
+                <h3>Traces{result.cached && " (cached)"}</h3>
                 {renderTraces()}
             </section>
 
@@ -66,6 +66,9 @@ export default function AgentFormModal({ mode, selectedAgent, onCloseAgentForm,
             if (promptName) {
                 agent.promptName = promptName;
             }
+            if (selectedAgent?.retrievalConfig) {
+                agent.retrievalConfig = selectedAgent.retrievalConfig;
+            }
             return agent;
         }
 
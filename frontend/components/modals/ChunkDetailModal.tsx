@@ -68,7 +68,7 @@ const renderHeatMap = (embedding: number[]) => {
     );
 };
 
-export default function ChunkDetailModal({ chunk, similarChunks, onCloseChunkDetail }: { chunk: Chunk, similarChunks: Chunk[], onCloseChunkDetail: Function; }) {
+export default function ChunkDetailModal({ chunk, fileName, similarChunks, onCloseChunkDetail }: { chunk: Chunk, fileName: string, similarChunks: Chunk[], onCloseChunkDetail: Function; }) {
     return (
         <div className="modal-overlay">
             <section className="chunk-detail-modal-container">
@@ -82,7 +82,7 @@ export default function ChunkDetailModal({ chunk, similarChunks, onCloseChunkDet
 
                     <div className="chunk-detail-modal-embedding">
                         <h4>Embedding Visualization:</h4>
-                        {renderHeatMap(chunk.embedding)}
+                        {renderHeatMap(chunk.embedding ?? [])}
                     </div>
 
                     <div className="chunk-detail-modal-similar">
@@ -90,7 +90,9 @@ export default function ChunkDetailModal({ chunk, similarChunks, onCloseChunkDet
                         <div>
                             {
                                 similarChunks.map((similarChunk: Chunk) => (
-                                    <span key={similarChunk.index}>●​ Chunk #{similarChunk.index + 1} ({similarChunk.score} similarity)</span>
+                                    <span key={`${similarChunk.fileName}-${similarChunk.index}`}>
+                                        ●​ {similarChunk.fileName && similarChunk.fileName !== fileName ? `${similarChunk.fileName} ` : ""}Chunk #{similarChunk.index + 1} ({similarChunk.score} similarity)
+                                    </span>
                                 ))
                             }
                         </div>
@@ -1,57 +1,98 @@
 import { useRef, useState } from "react";
 import { CloudUpload, FileCheck } from "lucide-react";
 import api from "../../utils/api";
+import type { IngestJob, BatchUploadItem } from "../../types/file";
 import ModalHeader from "./ModalHeader";
 import ModalFooter from "./ModalFooter";
 
 export default function UploadFileModal({ onCloseUpload, onUploadSuccess }: { onCloseUpload: Function, onUploadSuccess: Function; }) {
     const fileInputRef = useRef<HTMLInputElement>(null);
-    const [selectedFile, setSelectedFile] = useState<File | null>(null);
+    const [selectedFiles, setSelectedFiles] = useState<File[]>([]);
     const [error, setError] = useState<string>("");
     const [uploading, setUploading] = useState<boolean>(false);
+    const [progress, setProgress] = useState<string>("");
 
     const handleFileSelect = (e: React.ChangeEvent<HTMLInputElement>) => {
         setError("");
-        const file = e.target.files?.[0];
+        const files = Array.from(e.target.files ?? []);
 
-        if (!file) return;
+        if (files.length === 0) return;
 
-        if (file.type !== 'application/pdf') {
-            setError("Please select a PDF file");
-            setSelectedFile(null);
+        if (files.some(file => file.type !== 'application/pdf')) {
+            setError("Please select PDF files only");
+            setSelectedFiles([]);
             return;
         }
 
         const maxSize = 3 * 1024 * 1024;
-        if (file.size > maxSize) {
+        if (files.some(file => file.size > maxSize)) {
             setError("File size must be less than 3MB");
-            setSelectedFile(null);
+            setSelectedFiles([]);
             return;
         }
 
-        setSelectedFile(file);
+        setSelectedFiles(files);
     };
 
     const handleUpload = async () => {
-        if (!selectedFile) return;
+        if (selectedFiles.length === 0) return;
 
         setUploading(true);
         setError("");
 
         try {
-            const response = await api.file.uploadFile(selectedFile);
-            console.log(response);
+            const errors: string[] = [];
+
+            if (selectedFiles.length === 1) {
+                const jobId = await api.file.uploadFile(selectedFiles[0]);
+                const job = await waitForJob(jobId);
+                if (job.stage === "failed") {
+                    errors.push(job.error || "Failed to process file.");
+                }
+                console.log(`Embedding cache hit rate: ${(job.cacheHitRate * 100).toFixed(1)}%`);
+            } else {
+                const items: BatchUploadItem[] = await api.file.uploadFiles(selectedFiles);
+                for (const item of items) {
+                    if (item.jobId === null) {
+                        errors.push(`${item.fileName}: ${item.error}`);
+                        continue;
+                    }
+                    const job = await waitForJob(item.jobId);
+                    if (job.stage === "failed") {
+                        errors.push(`${item.fileName}: ${job.error || "Failed to process file."}`);
+                    }
+                }
+            }
+
             onUploadSuccess();
-            onCloseUpload();
+            if (errors.length > 0) {
+                setError(errors.join("\n"));
+            } else {
+                onCloseUpload();
+            }
         } catch (err: any) {
             setError(err.message || "Failed to upload file. Please try again.");
         } finally {
             setUploading(false);
+            setProgress("");
+        }
+    };
+
+    const waitForJob = async (jobId: number): Promise<IngestJob> => {
+        while (true) {
+            const job: IngestJob = await api.file.getJob(jobId);
+            if (job.stage === "done" || job.stage === "failed") return job;
+
+            setProgress(
+                job.stage === "queued"
+                    ? `${job.fileName}: Queued...`
+                    : `${job.fileName}: Page ${job.pagesDone}/${job.pagesTotal ?? "?"}, ${job.chunksEmbedded} chunks embedded`
+            );
+            await new Promise(resolve => setTimeout(resolve, 1000));
         }
     };
 
     const formatFileSize = (bytes: number) => {
-        console.log(bytes);
         if (bytes < 1024) return bytes + ' bytes';
         else if (bytes < 1048576) return Math.round(bytes / 1024) + ' KB';
         else return Math.round(bytes / 1048576) + ' MB';
@@ -60,11 +101,11 @@ export default function UploadFileModal({ onCloseUpload, onUploadSuccess }: { on
     return (
         <div className="modal-overlay">
             <section className="upload-modal-container">
-                <ModalHeader title="Upload PDF File" onClose={onCloseUpload} />
+                <ModalHeader title="Upload PDF Files" onClose={onCloseUpload} />
 
                 <div className="upload-area" onClick={() => fileInputRef.current?.click()}>
                     <CloudUpload size={52} />
-                    <p>Click to select a PDF file</p>
+                    <p>Click to select PDF files</p>
                     <p className="upload-hint">Max file size: 3MB</p>
                 </div>
 
@@ -72,18 +113,25 @@ export default function UploadFileModal({ onCloseUpload, onUploadSuccess }: { on
                     ref={fileInputRef}
                     type="file"
                     accept=".pdf,application/pdf"
+                    multiple
                     onChange={handleFileSelect}
                     style={{ display: 'none' }}
                 />
 
-                {selectedFile && (
-                    <div className="selected-file">
+                {selectedFiles.map(file => (
+                    <div className="selected-file" key={file.name}>
                         <div className="file-info">
                             <FileCheck size={20} />
-                            <span>{selectedFile.name}</span>
-                            <span className="file-size">({formatFileSize(selectedFile.size)})</span>
+                            <span>{file.name}</span>
+                            <span className="file-size">({formatFileSize(file.size)})</span>
                         </div>
                     </div>
+                ))}
+
+                {progress && (
+                    <div className="upload-hint">
+                        {progress}
+                    </div>
                 )}
 
                 {error && (
@@ -92,8 +140,8 @@ export default function UploadFileModal({ onCloseUpload, onUploadSuccess }: { on
                     </div>
                 )}
 
-                <ModalFooter submitLabel={uploading ? 'Uploading...' : 'Upload'} submitStyle="confirm" onClose={onCloseUpload} onSubmit={handleUpload} isDisabled={!selectedFile || uploading} />
+                <ModalFooter submitLabel={uploading ? 'Uploading...' : 'Upload'} submitStyle="confirm" onClose={onCloseUpload} onSubmit={handleUpload} isDisabled={selectedFiles.length === 0 || uploading} />
             </section>
         </div>
     );
-}
\ No newline at end of file
+}
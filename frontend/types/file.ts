@@ -6,6 +6,35 @@ export interface ChunkFile {
 export interface Chunk {
     index: number;
     content: string;
-    embedding: number[];
+    embedding?: number[];
     score: number | null;
+    fileName?: string;
+}
+
+export interface ChunkPage {
+    chunks: Chunk[];
+    total: number;
+    nextCursor: string | null;
+    embeddingEncoding: "json" | "float32" | "float16" | null;
+}
+
+export interface IngestJob {
+    id: number;
+    fileName: string;
+    mode: "add" | "update";
+    stage: "queued" | "parsing" | "embedding" | "done" | "failed";
+    pagesDone: number;
+    pagesTotal: number | null;
+    chunksEmbedded: number;
+    cacheHits: number;
+    chunksReused: number;
+    chunksRemoved: number;
+    cacheHitRate: number;
+    error: string | null;
+}
+
+export interface BatchUploadItem {
+    fileName: string;
+    jobId: number | null;
+    error: string | null;
 }
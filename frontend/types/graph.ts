@@ -10,6 +10,14 @@ export interface NumericConfig {
     instruction: string;
 }
 
+export interface RetrievalConfig {
+    candidateK: number;
+    finalK: number;
+    rerank: boolean;
+    cascade: boolean;
+    cascadeGap: number;
+}
+
 export interface AgentNode {
     name: string;
     agentType: "classifier" | "gatekeeper" | "scorer" | "responder";
@@ -20,6 +28,7 @@ export interface AgentNode {
 
     // For response agents
     promptName?: string;
+    retrievalConfig?: RetrievalConfig | null;
 }
 
 export interface LayoutedNode {
@@ -40,6 +40,7 @@ export interface RouteTrace {
     reason: string;
     nextNode: string;
     matchedCondition: string;
+    cached: boolean;
 }
 
 export interface RetrievedChunk {
@@ -48,12 +49,34 @@ export interface RetrievedChunk {
     content: string;
     distance: number;
     score: number;
+    reranked: boolean;
+}
+
+export interface RetrievalStats {
+    candidateK: number;
+    finalK: number;
+    candidates: number;
+    reranked: number;
+    rerankCached: number;
+    rerankSkipped: boolean;
+    rerankMs: number;
+    rerankSavedMs: number;
+}
+
+export interface SpeculationStats {
+    launched: number;
+    used: number;
 }
 
 export interface Result {
+    runId: string | null;
     query: string;
     chunks: RetrievedChunk[];
     context: string;
+    retrieval: RetrievalStats | null;
+    retrievalSkipped: boolean;
+    speculation: SpeculationStats | null;
     traces: (RespondTrace | RouteTrace)[];
     graph: Graph;
+    cached: boolean;
 }
\ No newline at end of file
@@ -30,7 +30,39 @@ export const fileAPI = {
         }
 
         const data = await response.json();
-        return data["message"];
+        return data["jobId"];
+    },
+    uploadFiles: async (files: File[]) => {
+        const formData = new FormData();
+        files.forEach(file => formData.append("files", file));
+
+        const response = await fetch(`${BASE}/file/upload/batch`, {
+            method: "POST",
+            body: formData
+        });
+
+        if (!response.ok) {
+            const errorData = await response.json();
+            const error = new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+            (error as any).status = response.status;
+            throw error;
+        }
+
+        const data = await response.json();
+        return data["files"];
+    },
+    getJob: async (jobId: number) => {
+        const response = await fetch(`${BASE}/file/jobs/${jobId}`);
+
+        if (!response.ok) {
+            const errorData = await response.json();
+            const error = new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+            (error as any).status = response.status;
+            throw error;
+        }
+
+        const data = await response.json();
+        return data;
     },
     clearFile: async () => {
         const response = await fetch(`${BASE}/file/delete`, {
@@ -46,13 +78,20 @@ export const fileAPI = {
         const data = await response.json();
         return data["message"];
     },
-    getChunks: async (fileName: string) => {
-        const response = await fetch(`${BASE}/file/${fileName}/chunks`);
+    getChunks: async (fileName: string, cursor?: string | null) => {
+        const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+        const response = await fetch(`${BASE}/file/${fileName}/chunks${params}`);
+        const data = await response.json();
+        return data;
+    },
+    getChunk: async (fileName: string, chunkIndex: number) => {
+        const response = await fetch(`${BASE}/file/${fileName}/chunks/${chunkIndex}`);
         const data = await response.json();
         return data;
     },
-    getScoredChunks: async (fileName: string, query: string) => {
-        const response = await fetch(`${BASE}/file/${fileName}/chunks`, {
+    getScoredChunks: async (fileName: string, query: string, cursor?: string | null) => {
+        const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+        const response = await fetch(`${BASE}/file/${fileName}/chunks${params}`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify({ query })
@@ -275,10 +314,18 @@ export const simulationAPI = {
             body: JSON.stringify({ query }),
         });
         const data = await response.json();
+        // Results are fetched by run id, the last one is shown again on reload.
+        localStorage.setItem("lastRunId", data["runId"]);
         return data["message"];
     },
-    getResult: async () => {
-        const response = await fetch(`${BASE}/simulation/result`);
+    getResult: async (runId: string | null = localStorage.getItem("lastRunId")) => {
+        if (!runId) {
+            const error = new Error("No simulation run yet.");
+            (error as any).status = 404;
+            throw error;
+        }
+
+        const response = await fetch(`${BASE}/simulation/result/${runId}`);
 
         if (!response.ok) {
             const errorData = await response.json();
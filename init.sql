@@ -12,6 +12,55 @@ CREATE TABLE doc_chunks (
     UNIQUE (file_name, chunk_index)
 );
 
+-- Precomputed top-k most similar chunks of every chunk
+CREATE TABLE chunk_neighbor (
+    chunk_id BIGINT NOT NULL REFERENCES doc_chunks (id) ON DELETE CASCADE,
+    neighbor_id BIGINT NOT NULL REFERENCES doc_chunks (id) ON DELETE CASCADE,
+    rank INT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (chunk_id, rank)
+);
+
+CREATE INDEX chunk_neighbor_neighbor_idx ON chunk_neighbor (neighbor_id);
+
+CREATE TABLE embedding_cache (
+    content_hash BYTEA NOT NULL, -- sha256 of the chunk text
+    model_name TEXT NOT NULL,
+    embedding VECTOR(384) NOT NULL, -- dim
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (content_hash, model_name)
+);
+
+-- ====================== Ingestion Job ======================
+
+CREATE TYPE valid_job_stage AS ENUM ('queued', 'parsing', 'embedding', 'done', 'failed');
+CREATE TYPE valid_job_mode AS ENUM ('add', 'update');
+
+CREATE SEQUENCE ingest_batch_seq;
+
+CREATE TABLE ingest_job (
+    id BIGSERIAL PRIMARY KEY,
+    batch_id BIGINT, -- jobs uploaded together are ingested together
+    file_name TEXT NOT NULL,
+    file_bytes BYTEA,
+    mode VALID_JOB_MODE NOT NULL DEFAULT 'add',
+    stage VALID_JOB_STAGE NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    claim_token UUID, -- set by every claim, a reclaimed job's old worker no longer matches
+    pages_done INT NOT NULL DEFAULT 0,
+    pages_total INT,
+    chunks_embedded INT NOT NULL DEFAULT 0,
+    cache_hits INT NOT NULL DEFAULT 0,
+    chunks_reused INT NOT NULL DEFAULT 0,
+    chunks_removed INT NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX ingest_job_pending_idx ON ingest_job (id)
+    WHERE stage IN ('queued', 'parsing', 'embedding');
+
 -- ====================== Prompt ======================
 
 CREATE TYPE valid_template AS ENUM ('guided_template', 'structured_template', 'raw_template');
@@ -81,6 +130,7 @@ CREATE TABLE agent_node (
     output_field TEXT,
     decision_config JSONB,
     prompt_name TEXT,
+    retrieval_config JSONB, -- responder-level override of the run's retrieval settings
     FOREIGN KEY (prompt_name) REFERENCES prompt(name)
         ON UPDATE CASCADE ON DELETE SET NULL
 );
@@ -129,4 +179,94 @@ BEGIN
 END;
 $$;
 
-CALL sp_set_default_graph();
\ No newline at end of file
+CALL sp_set_default_graph();
+
+-- ====================== Run Cache ======================
+
+-- Bumped by statement triggers whenever a table a simulation run reads from
+-- changes, cached runs are keyed by these versions. Every backend counts on
+-- its own row so that concurrent writers never wait on each other, the
+-- version of a scope is the sum of its rows.
+CREATE TABLE data_version_counter (
+    scope TEXT NOT NULL,
+    backend_pid INT NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, backend_pid)
+);
+
+INSERT INTO data_version_counter (scope, backend_pid)
+VALUES ('corpus', 0), ('graph', 0), ('prompt', 0);
+
+CREATE VIEW data_version AS
+SELECT scope, SUM(version)::BIGINT AS version
+FROM data_version_counter
+GROUP BY scope;
+
+CREATE FUNCTION bump_data_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO data_version_counter (scope, backend_pid, version)
+    VALUES (TG_ARGV[0], pg_backend_pid(), 1)
+    ON CONFLICT (scope, backend_pid)
+    DO UPDATE SET version = data_version_counter.version + 1;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_doc_chunks_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON doc_chunks
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_data_version('corpus');
+
+CREATE TRIGGER trg_agent_node_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON agent_node
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_data_version('graph');
+
+CREATE TRIGGER trg_edge_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON edge
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_data_version('graph');
+
+CREATE TRIGGER trg_prompt_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON prompt
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_data_version('prompt');
+
+CREATE TABLE run_cache (
+    id BIGSERIAL PRIMARY KEY,
+    version_hash TEXT NOT NULL, -- sha256 of the data versions and models
+    fingerprint TEXT NOT NULL, -- sha256 of the version hash and run options
+    query TEXT NOT NULL,
+    query_embedding VECTOR(384) NOT NULL, -- dim
+    result JSONB NOT NULL,
+    latency_ms REAL NOT NULL, -- how long the run took, i.e. what a hit saves
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX run_cache_query_idx ON run_cache (fingerprint, query);
+
+-- ====================== Simulation Results ======================
+
+-- Finished runs by run id, bounded and expired by the backend.
+CREATE TABLE simulation_result (
+    run_id UUID PRIMARY KEY,
+    result JSONB NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX simulation_result_created_at_idx ON simulation_result (created_at);
+
+-- ====================== LLM Response Cache ======================
+
+-- Responses of the decision agents, expired per agent type by the backend.
+CREATE TABLE llm_cache (
+    key BYTEA PRIMARY KEY, -- sha256 of prompt, model and sampling parameters
+    agent_type TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX llm_cache_agent_type_idx ON llm_cache (agent_type, created_at);